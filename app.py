@@ -3,6 +3,13 @@ import pandas as pd
 from sqlalchemy import text
 import datetime
 from streamlit_option_menu import option_menu
+from db import CONNECT_ARGS_REPLICA, RuteBaca, baca_frame, iter_frame, lsn_primary
+from partisi import batas_arsip
+from export import JUDUL_EXPORT, MIME, export_ke_file
+from upload import (
+    KOLOM_WAJIB, baca_file_upload, validasi_transaksi, simpan_transaksi,
+    sidik_file, sidik_blok, saring_blok_baru, fingerprint_tercatat, catat_ingest
+)
 
 # --- KONFIGURASI HALAMAN ---
 st.set_page_config(
@@ -150,7 +157,27 @@ st.markdown("""
 
 # --- KONEKSI DATABASE (SUPABASE/POSTGRES) ---
 # Menggunakan st.connection bawaan Streamlit
+# conn = PRIMARY (semua tulis). Read replica opsional: tambahkan [connections.supabase_replica] di secrets.toml
 conn = st.connection("supabase", type="sql")
+conn_replica = st.connection("supabase_replica", type="sql", connect_args=CONNECT_ARGS_REPLICA) if "supabase_replica" in st.secrets.get("connections", {}) else None
+
+@st.cache_resource
+def get_rute_baca():
+    # Satu per proses server, supaya cache cek lag replica dipakai bersama semua sesi
+    return RuteBaca(conn_replica.engine if conn_replica is not None else None)
+
+def conn_baca():
+    """Koneksi untuk SELECT: replica kalau sehat & sudah menyusul tulisan sesi ini, selain itu primary"""
+    lsn = st.session_state.get('lsn_tulis')
+    if get_rute_baca().pakai_replica(lsn):
+        st.session_state.lsn_tulis = None # Replica sudah menyusul, baca berikutnya tidak perlu cek LSN lagi
+        return conn_replica
+    return conn
+
+def catat_tulis(s):
+    """Panggil setelah commit ke primary: baca sesi ini ke replica ditahan sampai replica menyusul LSN ini"""
+    if conn_replica is not None:
+        st.session_state.lsn_tulis = lsn_primary(s)
 
 # --- FUNGSI HELPER ---
 def run_query(query_str, params=None):
@@ -160,13 +187,18 @@ def run_query(query_str, params=None):
         with conn.session as s:
             s.execute(text(query_str), params)
             s.commit()
+            catat_tulis(s)
     except Exception as e:
         st.error(f"Database Error: {e}")
 
 def get_data(query_str, params=None):
     """Fungsi khusus untuk mengambil data (SELECT) menjadi DataFrame"""
     # ttl=0 artinya jangan cache data, selalu ambil yang terbaru dari server
-    return conn.query(query_str, params=params, ttl=0)
+    return conn_baca().query(query_str, params=params, ttl=0)
+
+def get_data_besar(query_str, params=None):
+    """Untuk SELECT besar/lebar: di-stream lewat server-side cursor & disusun kolumnar (Arrow), hemat memori"""
+    return baca_frame(conn_baca().engine, query_str, params)
 
 def format_ribuan(value):
     """Mengubah angka menjadi string dengan pemisah ribuan titik (Format Indo)"""
@@ -188,12 +220,79 @@ def get_bulan_index(nama_bulan):
     except:
         return datetime.datetime.now().month
 
+def get_rentang_bulan(bulan, tahun):
+    """Tanggal awal bulan & awal bulan berikutnya (filter rentang agar partisi bulanan bisa dipangkas)"""
+    return datetime.date(tahun, bulan, 1), datetime.date(tahun + bulan // 12, bulan % 12 + 1, 1)
+
+# --- TREN 12 BULAN (SATU QUERY, WINDOW FUNCTION DI DATABASE) ---
+# 24 bulan dihitung supaya LAG(12) untuk YoY tersedia, lalu hanya 12 bulan terakhir yang ditampilkan
+QUERY_TREN = """
+    WITH bulan AS (
+        SELECT CAST(g AS date) AS bln
+        FROM generate_series(CAST(:awal_yoy AS date), CAST(:akhir AS date), interval '1 month') AS g
+    ),
+    realisasi AS (
+        SELECT CAST(date_trunc('month', tgl_sls) AS date) AS bln, SUM(qty_sls) AS qty, SUM(net_sls) AS rp
+        FROM transactions
+        WHERE rep_sls IN :sales_list
+        AND tgl_sls >= :awal_yoy AND tgl_sls < :batas
+        AND net_sls != 0
+        GROUP BY 1
+    ),
+    target AS (
+        SELECT make_date(tahun, bulan, 1) AS bln, SUM(target_qty) AS t_qty, SUM(target_tagihan) AS t_rp
+        FROM target_sales
+        WHERE salesman_nama IN :sales_list
+        AND (tahun * 100 + bulan) BETWEEN :kode_awal AND :kode_akhir
+        GROUP BY 1
+    ),
+    gabung AS (
+        SELECT b.bln,
+               COALESCE(r.qty, 0) AS qty, COALESCE(r.rp, 0) AS rp,
+               COALESCE(t.t_qty, 0) AS t_qty, COALESCE(t.t_rp, 0) AS t_rp
+        FROM bulan b
+        LEFT JOIN realisasi r ON r.bln = b.bln
+        LEFT JOIN target t ON t.bln = b.bln
+    ),
+    pertumbuhan AS (
+        SELECT *,
+               (qty - LAG(qty, 1) OVER w) / NULLIF(LAG(qty, 1) OVER w, 0) * 100 AS mom_qty,
+               (qty - LAG(qty, 12) OVER w) / NULLIF(LAG(qty, 12) OVER w, 0) * 100 AS yoy_qty,
+               (rp - LAG(rp, 1) OVER w) / NULLIF(LAG(rp, 1) OVER w, 0) * 100 AS mom_rp,
+               (rp - LAG(rp, 12) OVER w) / NULLIF(LAG(rp, 12) OVER w, 0) * 100 AS yoy_rp
+        FROM gabung
+        WINDOW w AS (ORDER BY bln)
+    )
+    SELECT *,
+           qty / NULLIF(t_qty, 0) * 100 AS pct_qty,
+           SUM(qty) OVER (ORDER BY bln) AS kum_qty,
+           SUM(t_qty) OVER (ORDER BY bln) AS kum_t_qty,
+           SUM(rp) OVER (ORDER BY bln) AS kum_rp
+    FROM pertumbuhan
+    WHERE bln >= :awal
+    ORDER BY bln
+"""
+
+@st.cache_data(ttl=600, show_spinner=False)
+def get_tren(_conn, sales_tuple, bulan, tahun):
+    """Tren 12 bulan s/d bulan-tahun terpilih untuk satu tim/salesman (di-cache per tim & periode).
+    _conn dipilih pemanggil (conn_baca) dan tidak ikut kunci cache. Cache dihapus setiap ada
+    simpan target / upload transaksi (get_tren.clear())."""
+    akhir, batas = get_rentang_bulan(bulan, tahun)
+    awal = datetime.date(tahun - 1 + bulan // 12, bulan % 12 + 1, 1)
+    awal_yoy = awal.replace(year=awal.year - 1)
+    return _conn.query(QUERY_TREN, ttl=0, params={
+        "sales_list": sales_tuple, "awal": awal, "awal_yoy": awal_yoy, "akhir": akhir, "batas": batas,
+        "kode_awal": awal_yoy.year * 100 + awal_yoy.month, "kode_akhir": tahun * 100 + bulan
+    })
+
 # --- FUNGSI LOGIN (POSTGRESQL VERSION) ---
 def check_login(username, password):
     # Parameter binding di SQLAlchemy pakai :nama_param
-    df = get_data(
+    # Login selalu ke primary (akun/password baru harus langsung berlaku)
+    df = conn.query(
         "SELECT username, role, real_name, nama_spv FROM users WHERE username=:u AND password=:p",
-        params={"u": username, "p": password}
+        params={"u": username, "p": password}, ttl=0
     )
     if not df.empty:
         return df.iloc[0] # Kembalikan baris pertama
@@ -258,8 +357,8 @@ else:
         """, unsafe_allow_html=True)
         
         # Opsi Menu
-        menu_options = ["Dashboard", "Laporan Rekap"]
-        menu_icons = ["grid-1x2-fill", "file-earmark-bar-graph-fill"]
+        menu_options = ["Dashboard", "Tren Penjualan", "Laporan Rekap"]
+        menu_icons = ["grid-1x2-fill", "graph-up-arrow", "file-earmark-bar-graph-fill"]
         
         if st.session_state.user_role in ['admin', 'spv']:
             menu_options.extend(["Input Target", "Kelola Pelanggan", "Upload Data", "Kelola User", "Master SPV"])
@@ -323,6 +422,7 @@ else:
                 curr_year = now.year
                 idx_thn = list_tahun.index(curr_year) if curr_year in list_tahun else 2
                 tahun_pilih = st.selectbox("📆 Pilih Tahun", list_tahun, index=idx_thn)
+            tgl_awal_bln, tgl_akhir_bln = get_rentang_bulan(bulan_pilih, tahun_pilih)
             
         # Logika Pengambilan Data
         sales_to_view = []
@@ -358,16 +458,15 @@ else:
                     t_qty = df_tgt.iloc[0]['target_qty'] if not df_tgt.empty else 0
                     t_tag = df_tgt.iloc[0]['target_tagihan'] if not df_tgt.empty else 0
                     
-                    # Realisasi (Pakai EXTRACT untuk date di Postgres)
+                    # Realisasi (rentang tanggal, bukan EXTRACT, supaya index & partisi terpakai)
                     query_real = """
                         SELECT SUM(qty_sls) as tot_qty 
                         FROM transactions 
                         WHERE rep_sls=:s 
-                        AND EXTRACT(MONTH FROM tgl_sls) = :b 
-                        AND EXTRACT(YEAR FROM tgl_sls) = :t
+                        AND tgl_sls >= :d1 AND tgl_sls < :d2
                         AND net_sls != 0
                     """
-                    df_real = get_data(query_real, params={"s": s, "b": bulan_pilih, "t": tahun_pilih})
+                    df_real = get_data(query_real, params={"s": s, "d1": tgl_awal_bln, "d2": tgl_akhir_bln})
                     r_qty = df_real.iloc[0]['tot_qty'] if not df_real.empty and pd.notnull(df_real.iloc[0]['tot_qty']) else 0
                         
                     total_target_qty += t_qty
@@ -439,13 +538,12 @@ else:
                     # 2. Ambil REALISASI
                     # Ambil Detail Transaksi untuk mapping customer yg sudah beli
                     query_trans_det = """
-                        SELECT * FROM transactions 
+                        SELECT cust_id, qty_sls FROM transactions 
                         WHERE rep_sls=:s 
-                        AND EXTRACT(MONTH FROM tgl_sls) = :b 
-                        AND EXTRACT(YEAR FROM tgl_sls) = :t
+                        AND tgl_sls >= :d1 AND tgl_sls < :d2
                         AND net_sls != 0
                     """
-                    df_trans = get_data(query_trans_det, params={"s": salesman, "b": bulan_pilih, "t": tahun_pilih})
+                    df_trans = get_data_besar(query_trans_det, params={"s": salesman, "d1": tgl_awal_bln, "d2": tgl_akhir_bln})
                     
                     if not df_trans.empty:
                         real_qty = df_trans['qty_sls'].sum()
@@ -467,7 +565,7 @@ else:
                     # 4. CALL PLAN
                     st.markdown(f"<h5 style='margin-top:20px; color:#475569 !important;'>📢 Call Plan (Belum Order)</h5>", unsafe_allow_html=True)
                     
-                    df_master_plg = get_data("SELECT cust_id as 'ID', nama_cst as 'Nama Toko', alamat as 'Alamat' FROM master_customer WHERE salesman_pengampu = :s", params={"s": salesman})
+                    df_master_plg = get_data('SELECT cust_id as "ID", nama_cst as "Nama Toko", alamat as "Alamat" FROM master_customer WHERE salesman_pengampu = :s', params={"s": salesman})
                     
                     if not df_master_plg.empty:
                         df_belum_beli = df_master_plg[~df_master_plg['ID'].isin(cust_sudah_beli)]
@@ -478,6 +576,61 @@ else:
                     else:
                         st.warning("Belum ada mapping pelanggan untuk sales ini.")
 
+    # --- HALAMAN 1B: TREN PENJUALAN ---
+    elif selected == "Tren Penjualan":
+        st.markdown("## 📈 Tren Penjualan 12 Bulan")
+        
+        now = datetime.datetime.now()
+        col_t1, col_t2, col_t3 = st.columns(3)
+        with col_t1:
+            nm_bln_tren = st.selectbox("📅 Sampai Bulan", NAMA_BULAN, index=now.month-1)
+            bulan_tren = get_bulan_index(nm_bln_tren)
+        with col_t2:
+            list_tahun = [2024, 2025, 2026, 2027]
+            tahun_tren = st.selectbox("📆 Tahun", list_tahun, index=list_tahun.index(now.year) if now.year in list_tahun else 2)
+        with col_t3:
+            if st.session_state.user_role in ['admin', 'spv']:
+                if st.session_state.user_role == 'spv':
+                    list_team = get_data("SELECT real_name FROM users WHERE nama_spv = :spv", params={"spv": st.session_state.real_name})['real_name'].tolist()
+                else:
+                    list_team = get_data("SELECT DISTINCT real_name FROM users WHERE role='salesman'")['real_name'].tolist()
+                pilih_tren = st.selectbox("Salesman", ["SEMUA TIM"] + list_team)
+                sales_tren = list_team if pilih_tren == "SEMUA TIM" else [pilih_tren]
+            else:
+                st.write(f"Salesman: **{st.session_state.real_name}**")
+                sales_tren = [st.session_state.real_name]
+        
+        st.divider()
+        
+        if sales_tren:
+            # sorted() supaya urutan nama tidak membuat entri cache baru untuk tim yang sama
+            df_tren = get_tren(conn_baca(), tuple(sorted(sales_tren)), bulan_tren, tahun_tren)
+            df_tren['Bulan'] = df_tren['bln'].apply(lambda d: f"{NAMA_BULAN[d.month-1][:3]} {d.year}")
+            
+            st.markdown("#### Realisasi vs Target (Qty)")
+            st.line_chart(df_tren.set_index('bln')[['qty', 't_qty']].rename(columns={'qty': 'Realisasi', 't_qty': 'Target'}))
+            
+            def fmt_pct(x):
+                return "-" if pd.isna(x) else f"{x:+.1f}%"
+            
+            df_tren_disp = pd.DataFrame({
+                'Bulan': df_tren['Bulan'],
+                'Target Qty': df_tren['t_qty'].apply(format_ribuan),
+                'Realisasi Qty': df_tren['qty'].apply(format_ribuan),
+                '% Capai': df_tren['pct_qty'].apply(lambda x: "-" if pd.isna(x) else f"{x:.1f}%"),
+                'MoM Qty': df_tren['mom_qty'].apply(fmt_pct),
+                'YoY Qty': df_tren['yoy_qty'].apply(fmt_pct),
+                'Kumulatif Qty': df_tren['kum_qty'].apply(format_ribuan),
+                'Kumulatif Target': df_tren['kum_t_qty'].apply(format_ribuan),
+                'Realisasi Rp': df_tren['rp'].apply(format_ribuan),
+                'MoM Rp': df_tren['mom_rp'].apply(fmt_pct),
+                'YoY Rp': df_tren['yoy_rp'].apply(fmt_pct),
+                'Kumulatif Rp': df_tren['kum_rp'].apply(format_ribuan),
+            })
+            st.dataframe(df_tren_disp, use_container_width=True)
+        else:
+            st.info("Belum ada Salesman yang terdaftar.")
+
     # --- HALAMAN 2: LAPORAN REKAP ---
     elif selected == "Laporan Rekap":
         st.markdown("## 📑 Laporan Rekapitulasi")
@@ -513,24 +666,23 @@ else:
             # Kita gunakan format string Python standard untuk list salesman karena ini aman jika list dari database sendiri
             sales_tuple = tuple(target_salesman)
             query_rekap = f"""
-                SELECT * FROM transactions 
+                SELECT cust_id, nama_cst, kode_itm, nama_itm, qty_sls, net_sls FROM transactions 
                 WHERE rep_sls IN :sales_list
                 AND tgl_sls BETWEEN :d1 AND :d2
                 AND net_sls != 0 
             """
             # SQL Alchemy requires tuple for list params
-            df_rekap = get_data(query_rekap, params={"sales_list": sales_tuple, "d1": tgl_awal, "d2": tgl_akhir})
+            # Agregasi bertahap per batch, jadi seluruh transaksi periode tidak pernah ada di memori sekaligus
+            parsial_cust, parsial_prod = [], []
+            for df_batch in iter_frame(conn_baca().engine, query_rekap, {"sales_list": sales_tuple, "d1": tgl_awal, "d2": tgl_akhir}):
+                parsial_cust.append(df_batch.groupby(['cust_id', 'nama_cst'])[['qty_sls', 'net_sls']].sum())
+                parsial_prod.append(df_batch.groupby(['kode_itm', 'nama_itm'])[['qty_sls', 'net_sls']].sum())
             
-            if not df_rekap.empty:
-                # df_rekap['tgl_sls'] otomatis datetime jika dari Postgres
-                
+            if parsial_cust:
                 tab_cust, tab_prod = st.tabs(["👥 Rekap Per Pelanggan", "📦 Rekap Per Produk"])
                 
                 with tab_cust:
-                    df_grp_cust = df_rekap.groupby(['cust_id', 'nama_cst']).agg({
-                        'qty_sls': 'sum',
-                        'net_sls': 'sum'
-                    }).reset_index().sort_values(by='net_sls', ascending=False)
+                    df_grp_cust = pd.concat(parsial_cust).groupby(level=[0, 1]).sum().reset_index().sort_values(by='net_sls', ascending=False)
                     
                     df_grp_cust['Total Qty'] = df_grp_cust['qty_sls'].apply(format_ribuan)
                     df_grp_cust['Total Rupiah'] = df_grp_cust['net_sls'].apply(format_ribuan)
@@ -542,10 +694,7 @@ else:
                     st.markdown(f"### Total Omzet: Rp {format_ribuan(df_grp_cust['net_sls'].sum())}")
 
                 with tab_prod:
-                    df_grp_prod = df_rekap.groupby(['kode_itm', 'nama_itm']).agg({
-                        'qty_sls': 'sum',
-                        'net_sls': 'sum'
-                    }).reset_index().sort_values(by='qty_sls', ascending=False)
+                    df_grp_prod = pd.concat(parsial_prod).groupby(level=[0, 1]).sum().reset_index().sort_values(by='qty_sls', ascending=False)
                     
                     df_grp_prod['Total Qty'] = df_grp_prod['qty_sls'].apply(format_ribuan)
                     df_grp_prod['Total Rupiah'] = df_grp_prod['net_sls'].apply(format_ribuan)
@@ -554,6 +703,27 @@ else:
                         'kode_itm': 'Kode Item', 'nama_itm': 'Nama Produk'
                     })
                     st.dataframe(df_display_prod, use_container_width=True, height=500)
+
+                # Export di-stream langsung dari DB (server-side cursor)
+                with st.expander("⬇️ Export Data", expanded=False):
+                    col_x1, col_x2, col_x3 = st.columns([2, 1, 1])
+                    with col_x1:
+                        jenis_export = st.selectbox("Jenis Data", list(JUDUL_EXPORT.keys()), format_func=JUDUL_EXPORT.get)
+                    with col_x2:
+                        fmt_export = st.radio("Format", ["xlsx", "csv"], horizontal=True)
+                    with col_x3:
+                        st.write("")
+                        siapkan_export = st.button("Siapkan File", type="primary")
+                    
+                    if siapkan_export:
+                        with st.spinner("Menyiapkan file export..."):
+                            data_export = export_ke_file(conn_baca().engine, jenis_export, {"sales_list": sales_tuple, "d1": tgl_awal, "d2": tgl_akhir}, fmt_export)
+                        st.download_button(
+                            f"⬇️ Unduh {JUDUL_EXPORT[jenis_export]} ({fmt_export.upper()})",
+                            data_export,
+                            file_name=f"{jenis_export}_{tgl_awal}_{tgl_akhir}.{fmt_export}",
+                            mime=MIME[fmt_export]
+                        )
             else:
                 st.warning("Tidak ada data transaksi pada periode yang dipilih.")
         else:
@@ -595,6 +765,7 @@ else:
                         "s": pilih_sales, "b": pilih_bln_angka, "t": pilih_thn,
                         "qty": in_target_qty, "rp": in_target_tagihan
                     })
+                    get_tren.clear()
                     st.success(f"✅ Target untuk {pilih_sales} berhasil disimpan.")
                     st.rerun()
 
@@ -630,6 +801,8 @@ else:
                     q_upd = "UPDATE target_sales SET target_qty=:qty, target_tagihan=:rp WHERE id=:id"
                     s.execute(text(q_upd), {"qty": row['target_qty'], "rp": row['target_tagihan'], "id": row['id']})
                 s.commit()
+                catat_tulis(s)
+            get_tren.clear()
             st.success("Perubahan tabel berhasil disimpan!")
 
     # --- HALAMAN 4: KELOLA PELANGGAN ---
@@ -646,7 +819,7 @@ else:
             q_base += " WHERE nama_cst ILIKE :txt OR alamat ILIKE :txt OR cust_id ILIKE :txt" # ILIKE = Case Insensitive Postgres
             p_base = {"txt": f"%{search_txt}%"}
             
-        df_cust = get_data(q_base, params=p_base)
+        df_cust = get_data_besar(q_base, params=p_base)
         
         if not df_cust.empty:
             with st.container():
@@ -654,7 +827,7 @@ else:
                 col_edit1, col_edit2, col_edit3 = st.columns([3, 2, 1])
                 with col_edit1:
                     df_cust['display_text'] = df_cust.apply(
-                        lambda x: f"{x['cust_id']} - {x['nama_cst']} ({x['alamat'] if x['alamat'] else '-'})", axis=1
+                        lambda x: f"{x['cust_id']} - {x['nama_cst']} ({x['alamat'] if pd.notna(x['alamat']) and x['alamat'] else '-'})", axis=1
                     )
                     pilih_cust_str = st.selectbox("Pilih Pelanggan", df_cust['display_text'])
                     real_cust_id = pilih_cust_str.split(" - ")[0]
@@ -664,7 +837,7 @@ else:
                     list_sales.insert(0, "")
                     
                     curr_sales = df_cust[df_cust['cust_id'] == real_cust_id]['salesman_pengampu'].values[0]
-                    idx_sel = list_sales.index(curr_sales) if curr_sales in list_sales else 0
+                    idx_sel = list_sales.index(curr_sales) if pd.notna(curr_sales) and curr_sales in list_sales else 0
                     
                     new_salesman = st.selectbox("Salesman Penanggung Jawab", list_sales, index=idx_sel)
                 
@@ -692,8 +865,7 @@ else:
             file_master = st.file_uploader("File Customer (Excel/CSV)", type=['xlsx', 'csv'], key="up_master")
             
             if file_master and st.button("Proses Upload Master", type="primary"):
-                df = pd.read_csv(file_master) if file_master.name.endswith('.csv') else pd.read_excel(file_master)
-                df.columns = [str(col).strip().lower() for col in df.columns]
+                df = baca_file_upload(file_master)
                 
                 # Mapping Kolom Sederhana
                 col_map = {}
@@ -730,6 +902,7 @@ else:
                                 pass
                             if i % 10 == 0: progress.progress((i+1)/len(df))
                         s.commit()
+                        catat_tulis(s)
                     st.success("Selesai Upload Master!")
 
         # TAB 2: TRANSAKSI
@@ -737,58 +910,70 @@ else:
             st.info("Upload Transaksi (Menggunakan Kunci Unik agar tidak duplikat)")
             file_trans = st.file_uploader("File Penjualan (Excel/CSV)", type=['xlsx', 'csv'], key="up_trans")
             
+            paksa_ulang = st.checkbox("Abaikan riwayat upload (paksa proses ulang semua baris)", key="paksa_trans")
+            
             if file_trans and st.button("Proses Upload Transaksi", type="primary"):
-                df_tr = pd.read_csv(file_trans) if file_trans.name.endswith('.csv') else pd.read_excel(file_trans)
-                df_tr.columns = [str(c).strip().lower() for c in df_tr.columns]
-                
-                required_cols = ['cust_id', 'tgl_sls', 'rep_sls', 'qty_sls', 'net_sls']
-                missing = [c for c in required_cols if c not in df_tr.columns]
+                # 1. File yang persis sama tidak perlu dibaca ulang sama sekali
+                fp_file = sidik_file(file_trans.getvalue())
+                with conn.session as s:
+                    file_sudah_ada = not paksa_ulang and fingerprint_tercatat(s, [fp_file])
                 
-                if missing:
-                    st.error(f"Kolom wajib hilang: {missing}")
+                if file_sudah_ada:
+                    st.info("File ini sudah pernah diupload sebelumnya. Tidak ada data baru.")
                 else:
-                    progress = st.progress(0)
-                    with conn.session as s:
-                        for i, row in df_tr.iterrows():
-                            try:
-                                raw_tgl = row['tgl_sls']
-                                val_tgl = pd.to_datetime(raw_tgl).date() if pd.notnull(raw_tgl) else None
-                            except: val_tgl = None
-                            
-                            q_ins = """
-                                INSERT INTO transactions (nomdok, tgl_sls, rep_sls, nama_spv, cust_id, nama_cst, kode_itm, nama_itm, qty_sls, net_sls)
-                                VALUES (:nom, :tgl, :rep, :spv, :cid, :cnm, :kitm, :nitm, :qty, :net)
-                                ON CONFLICT (nomdok, kode_itm, qty_sls, net_sls) DO NOTHING
-                            """
-                            try:
-                                s.execute(text(q_ins), {
-                                    "nom": str(row.get('nomdok', '')),
-                                    "tgl": val_tgl,
-                                    "rep": str(row['rep_sls']),
-                                    "spv": str(row.get('nama_spv', '')),
-                                    "cid": str(row['cust_id']),
-                                    "cnm": str(row.get('nama_cst', '')),
-                                    "kitm": str(row.get('kode_itm', '')),
-                                    "nitm": str(row.get('nama_itm', '')),
-                                    "qty": float(row['qty_sls']) if pd.notnull(row['qty_sls']) else 0.0,
-                                    "net": float(row['net_sls']) if pd.notnull(row['net_sls']) else 0.0
-                                })
-                                
-                                # Auto Update Mapping jika kosong
-                                if row['rep_sls'] and str(row['rep_sls']) != 'nan':
-                                    q_up_map = """
-                                        UPDATE master_customer 
-                                        SET salesman_pengampu = :s 
-                                        WHERE cust_id = :id AND (salesman_pengampu IS NULL OR salesman_pengampu = '')
-                                    """
-                                    s.execute(text(q_up_map), {"s": str(row['rep_sls']), "id": str(row['cust_id'])})
-                                    
-                            except Exception as e:
-                                pass # Skip error row
+                    df_tr = baca_file_upload(file_trans)
+                    
+                    missing = [c for c in KOLOM_WAJIB if c not in df_tr.columns]
+                    
+                    if missing:
+                        st.error(f"Kolom wajib hilang: {missing}")
+                    else:
+                        # 2. Validasi sekaligus terhadap master di memori (bukan per baris ke DB)
+                        rep_valid = set(get_data("SELECT real_name FROM users WHERE role='salesman'")['real_name'].astype(str))
+                        cust_valid = set(get_data("SELECT cust_id FROM master_customer")['cust_id'].astype(str))
+                        with conn.session as s:
+                            tgl_arsip = batas_arsip(s)
+                        df_bersih, df_tolak, jml_duplikat = validasi_transaksi(df_tr, rep_valid, cust_valid, tgl_arsip)
+                        
+                        with conn.session as s:
+                            # 3. Hanya blok harian yang belum pernah masuk yang dikirim ke DB
+                            if paksa_ulang:
+                                df_baru, fp_baru = df_bersih, sidik_blok(df_bersih).value_counts().to_dict()
+                            else:
+                                df_baru, fp_baru = saring_blok_baru(s, df_bersih)
                             
-                            if i % 10 == 0: progress.progress((i+1)/len(df_tr))
-                        s.commit()
-                    st.success("Transaksi Berhasil Diupload!")
+                            jml_masuk = 0
+                            if not df_baru.empty:
+                                progress = st.progress(0)
+                                jml_masuk = simpan_transaksi(s, df_baru, progress=progress.progress)
+                            riwayat_aktif = catat_ingest(s, fp_baru, 'blok', file_trans.name, st.session_state.username)
+                            # File hanya dianggap tuntas kalau tidak ada baris ditolak (bisa lolos setelah master diperbaiki)
+                            if df_tolak.empty:
+                                catat_ingest(s, {fp_file: len(df_bersih)}, 'file', file_trans.name, st.session_state.username)
+                            s.commit()
+                            catat_tulis(s)
+                        get_tren.clear()
+                        
+                        st.session_state.upload_tolak = df_tolak if not df_tolak.empty else None
+                        # masuk + sudah ada + duplikat + ditolak = jumlah baris di file
+                        st.success(f"Transaksi Berhasil Diupload! {jml_masuk} baris baru masuk, "
+                                   f"{len(df_bersih) - jml_masuk} baris sudah ada di database, "
+                                   f"{jml_duplikat} baris duplikat di dalam file, {len(df_tolak)} baris ditolak.")
+                        if not riwayat_aktif:
+                            st.info("Riwayat upload belum aktif, jadi upload ulang akan diproses penuh. "
+                                    "Jalankan `python upload.py siapkan` sekali untuk mengaktifkannya.")
+
+            # Laporan baris yang ditolak (disimpan di session agar tidak hilang saat rerun)
+            df_tolak_sesi = st.session_state.get('upload_tolak')
+            if df_tolak_sesi is not None:
+                st.warning(f"⚠️ {len(df_tolak_sesi)} baris ditolak. Perbaiki lalu upload ulang.")
+                st.dataframe(df_tolak_sesi.head(100), use_container_width=True)
+                st.download_button(
+                    "⬇️ Unduh Laporan Baris Ditolak (CSV)",
+                    df_tolak_sesi.to_csv(index=False).encode('utf-8'),
+                    file_name="transaksi_ditolak.csv",
+                    mime="text/csv"
+                )
 
     # --- HALAMAN 6: KELOLA USER ---
     elif selected == "Kelola User":
@@ -0,0 +1,56 @@
+"""Benchmark validasi & fingerprint blok upload transaksi pada file sintetis (default 500 ribu baris).
+
+Jalankan dari root repo:  python benchmarks/bench_upload.py [jumlah_baris]
+"""
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from upload import sidik_blok, validasi_transaksi  # noqa: E402
+
+
+def buat_file_transaksi(n, seed=0):
+    """DataFrame mirip hasil read_csv export bulanan, dengan ~1% baris rusak"""
+    rng = np.random.default_rng(seed)
+    sales = [f"Sales {i}" for i in range(40)]
+    tgl = pd.Timestamp("2025-01-01") + pd.to_timedelta(rng.integers(0, 365, n), unit="D")
+    df = pd.DataFrame({
+        "nomdok": [f"INV{i:08d}" for i in range(n)],
+        "tgl_sls": tgl.strftime("%Y-%m-%d"),
+        "rep_sls": rng.choice(sales, n),
+        "nama_spv": "SPV A",
+        "cust_id": pd.Series(rng.integers(1, 20000, n)).map("C{:05d}".format),
+        "nama_cst": "Toko",
+        "kode_itm": pd.Series(rng.integers(1, 500, n)).map("I{:04d}".format),
+        "nama_itm": "Produk",
+        "qty_sls": rng.integers(1, 50, n).astype(float),
+        "net_sls": rng.integers(1, 5_000_000, n).astype(float),
+    })
+    rusak = rng.random(n) < 0.01
+    df.loc[rusak, "tgl_sls"] = "bukan tanggal"
+    df["qty_sls"] = df["qty_sls"].astype(object)
+    df.loc[rng.random(n) < 0.005, "qty_sls"] = "x"
+    df.loc[rng.random(n) < 0.005, "rep_sls"] = np.nan
+    return df, set(sales), {f"C{i:05d}" for i in range(1, 20000)}
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 500_000
+    df, rep_valid, cust_valid = buat_file_transaksi(n)
+    t0 = time.perf_counter()
+    bersih, tolak, duplikat = validasi_transaksi(df, rep_valid, cust_valid)
+    dt = time.perf_counter() - t0
+    print(f"validasi {n} baris: {dt:.2f} dtk ({n / dt:,.0f} baris/dtk), bersih={len(bersih)}, tolak={len(tolak)}, duplikat={duplikat}")
+    print(tolak['alasan'].value_counts().to_string())
+
+    t0 = time.perf_counter()
+    fp = sidik_blok(bersih)
+    print(f"sidik_blok {len(bersih)} baris: {time.perf_counter() - t0:.2f} dtk, {fp.nunique()} blok")
+
+    # Export bulan berikutnya yang tumpang tindih: hari yang sama harus menghasilkan fingerprint yang sama
+    ulang = bersih.sample(frac=1, random_state=1)
+    assert sidik_blok(ulang).sort_index().equals(fp.sort_index())
@@ -0,0 +1,162 @@
+import os
+import threading
+import time
+import tomllib
+from contextlib import contextmanager
+
+import pandas as pd
+import pyarrow as pa
+from sqlalchemy import URL, create_engine, text
+
+
+# --- ENGINE UNTUK SKRIP DI LUAR STREAMLIT (MAINTENANCE / BENCHMARK) ---
+def buat_engine(url=None, nama_koneksi="supabase"):
+    """Engine dari url, env DATABASE_URL, atau [connections.<nama>] di secrets.toml (sama seperti st.connection)"""
+    url = url or os.environ.get("DATABASE_URL")
+    if url:
+        return create_engine(url)
+    for path in (".streamlit/secrets.toml", "secrets.toml"):
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                cfg = tomllib.load(f)["connections"][nama_koneksi]
+            return create_engine(URL.create(
+                drivername=cfg["dialect"] + (f"+{cfg['driver']}" if cfg.get("driver") else ""),
+                username=cfg.get("username"), password=cfg.get("password"),
+                host=cfg.get("host"), port=int(cfg["port"]) if cfg.get("port") else None, database=cfg.get("database"),
+            ))
+    raise RuntimeError("Koneksi database tidak ditemukan (isi DATABASE_URL atau secrets.toml)")
+
+
+# --- PEMBACAAN DATA BESAR (SERVER-SIDE CURSOR) ---
+UKURAN_BATCH = 10000
+
+
+@contextmanager
+def _stream(engine, query_str, params, ukuran_batch):
+    """Result dari named cursor Postgres (stream_results): baris diambil per batch dari server"""
+    with engine.connect() as c:
+        yield c.execution_options(yield_per=ukuran_batch).execute(text(query_str), params or {})
+
+
+def iter_batch(engine, query_str, params=None, ukuran_batch=UKURAN_BATCH):
+    """Generator (kolom, list_baris) per batch.
+
+    Memakai named cursor di Postgres (stream_results), jadi hasil query tidak pernah
+    dimuat utuh ke memori Python.
+    """
+    with _stream(engine, query_str, params, ukuran_batch) as result:
+        kolom = list(result.keys())
+        for baris in result.partitions():
+            yield kolom, baris
+
+
+def _ke_arrow(kolom, baris):
+    """Satu batch baris (tuple) jadi RecordBatch kolumnar. NUMERIC (Decimal) dijadikan float seperti read_sql"""
+    arrays = []
+    for data in zip(*baris):
+        arr = pa.array(data)
+        if pa.types.is_decimal(arr.type):
+            arr = arr.cast(pa.float64())
+        arrays.append(arr)
+    return pa.RecordBatch.from_arrays(arrays, names=kolom)
+
+
+def _ke_pandas(tabel):
+    # String tetap disimpan di buffer Arrow, bukan satu objek Python per sel
+    return tabel.to_pandas(types_mapper={pa.string(): pd.StringDtype("pyarrow")}.get)
+
+
+def iter_frame(engine, query_str, params=None, ukuran_batch=UKURAN_BATCH):
+    """Generator DataFrame per batch, untuk agregasi bertahap tanpa memuat seluruh hasil"""
+    for kolom, baris in iter_batch(engine, query_str, params, ukuran_batch):
+        yield _ke_pandas(pa.Table.from_batches([_ke_arrow(kolom, baris)]))
+
+
+def baca_frame(engine, query_str, params=None, ukuran_batch=UKURAN_BATCH):
+    """Pengganti conn.query untuk SELECT lebar/besar: batch di-stream lalu disusun kolumnar lewat Arrow"""
+    with _stream(engine, query_str, params, ukuran_batch) as result:
+        kolom = list(result.keys())
+        batches = [_ke_arrow(kolom, baris) for baris in result.partitions()]
+    if not batches:
+        return pd.DataFrame(columns=kolom)
+    tabel = pa.concat_tables([pa.Table.from_batches([b]) for b in batches], promote_options="default")
+    return _ke_pandas(tabel)
+
+
+# --- RUTE BACA: READ REPLICA (OPSIONAL) ---
+MAKS_LAG_DETIK = 5.0
+JEDA_CEK_LAG_DETIK = 2.0
+# Replica yang mati / macet tidak boleh menahan sesi: koneksi & query cek dibatasi waktunya
+CONNECT_ARGS_REPLICA = {"connect_timeout": 3}
+BATAS_QUERY_CEK_MS = 1000
+
+Q_LAG_REPLICA = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN NULL
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+"""
+
+
+def lsn_primary(session):
+    """Posisi WAL primary sekarang (panggil setelah commit untuk read-your-writes)"""
+    return session.execute(text("SELECT pg_current_wal_lsn()::text")).scalar()
+
+
+class RuteBaca:
+    """Menentukan apakah sebuah baca boleh ke replica.
+
+    Replica dipakai hanya jika: terjangkau, benar-benar standby, lag <= maks_lag_detik, dan
+    (kalau sesi baru saja menulis) sudah me-replay WAL sampai LSN tulisan tsb. Selain itu primary.
+    Hasil cek lag di-cache jeda_cek_detik supaya tidak ada query tambahan di setiap baca.
+    """
+
+    def __init__(self, replica=None, maks_lag_detik=MAKS_LAG_DETIK, jeda_cek_detik=JEDA_CEK_LAG_DETIK):
+        self.replica = replica
+        self.maks_lag_detik = maks_lag_detik
+        self.jeda_cek_detik = jeda_cek_detik
+        self._lag = None
+        self._waktu_cek = 0.0
+        self._lock = threading.Lock()
+        self._sedang_cek = False
+
+    def _cek(self, query, params=None):
+        """Satu query pendek ke replica dengan statement_timeout lokal (hanya transaksi ini)"""
+        with self.replica.connect() as c:
+            c.execute(text("SELECT set_config('statement_timeout', :ms, true)"), {"ms": str(BATAS_QUERY_CEK_MS)})
+            return c.execute(text(query), params or {}).scalar()
+
+    def lag_replica(self):
+        """Lag replica dalam detik (cache), None jika replica tidak bisa dipakai.
+        Cek ke replica dilakukan di luar lock oleh satu thread; thread lain tidak menunggu,
+        langsung memakai hasil cek terakhir."""
+        with self._lock:
+            if self._sedang_cek or time.monotonic() - self._waktu_cek < self.jeda_cek_detik:
+                return self._lag
+            self._sedang_cek = True
+        lag = None
+        try:
+            hasil = self._cek(Q_LAG_REPLICA)
+            lag = None if hasil is None else float(hasil)
+        except Exception:
+            pass
+        finally:
+            with self._lock:
+                self._lag, self._waktu_cek, self._sedang_cek = lag, time.monotonic(), False
+        return lag
+
+    def sudah_menyusul(self, lsn):
+        """Apakah replica sudah me-replay WAL sampai lsn"""
+        try:
+            return bool(self._cek("SELECT pg_last_wal_replay_lsn() >= CAST(:lsn AS pg_lsn)", {"lsn": lsn}))
+        except Exception:
+            return False
+
+    def pakai_replica(self, lsn_tulis=None):
+        if self.replica is None:
+            return False
+        lag = self.lag_replica()
+        if lag is None or lag > self.maks_lag_detik:
+            return False
+        return lsn_tulis is None or self.sudah_menyusul(lsn_tulis)
@@ -0,0 +1,100 @@
+import csv
+import io
+import tempfile
+
+from openpyxl import Workbook
+
+from db import iter_batch
+
+# --- QUERY EXPORT LAPORAN REKAP ---
+# Filter sama dengan halaman Laporan Rekap: :sales_list (tuple), :d1, :d2
+_FILTER = """
+    WHERE rep_sls IN :sales_list
+    AND tgl_sls BETWEEN :d1 AND :d2
+    AND net_sls != 0
+"""
+
+QUERY_EXPORT = {
+    "pelanggan": f"""
+        SELECT cust_id AS "Kode Pelanggan", nama_cst AS "Nama Pelanggan",
+               SUM(qty_sls) AS "Total Qty", SUM(net_sls) AS "Total Rupiah"
+        FROM transactions {_FILTER}
+        GROUP BY cust_id, nama_cst
+        ORDER BY "Total Rupiah" DESC
+    """,
+    "produk": f"""
+        SELECT kode_itm AS "Kode Item", nama_itm AS "Nama Produk",
+               SUM(qty_sls) AS "Total Qty", SUM(net_sls) AS "Total Rupiah"
+        FROM transactions {_FILTER}
+        GROUP BY kode_itm, nama_itm
+        ORDER BY "Total Qty" DESC
+    """,
+    "transaksi": f"""
+        SELECT nomdok, tgl_sls, rep_sls, nama_spv, cust_id, nama_cst, kode_itm, nama_itm, qty_sls, net_sls
+        FROM transactions {_FILTER}
+        ORDER BY tgl_sls, nomdok, kode_itm
+    """,
+}
+
+JUDUL_EXPORT = {
+    "pelanggan": "Rekap Per Pelanggan",
+    "produk": "Rekap Per Produk",
+    "transaksi": "Transaksi",
+}
+
+# Batas Excel 1.048.576 baris per sheet, dikurangi 1 untuk header
+MAKS_BARIS_XLSX = 1048575
+
+MIME = {
+    "csv": "text/csv",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+
+def tulis_csv(batches, fileobj):
+    """Tulis batch (kolom, baris) ke file biner sebagai CSV UTF-8, satu batch per flush"""
+    header_ditulis = False
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for kolom, baris in batches:
+        if not header_ditulis:
+            writer.writerow(kolom)
+            header_ditulis = True
+        writer.writerows(baris)
+        fileobj.write(buf.getvalue().encode('utf-8'))
+        buf.seek(0)
+        buf.truncate()
+
+
+def tulis_xlsx(batches, fileobj, judul="Data"):
+    """Tulis batch (kolom, baris) ke workbook write-only openpyxl (baris langsung di-stream ke disk).
+    Kalau melebihi batas baris Excel, lanjut ke sheet berikutnya."""
+    wb = Workbook(write_only=True)
+    ws, kolom_header, isi_sheet, no_sheet = None, None, 0, 0
+    for kolom, baris in batches:
+        kolom_header = kolom
+        for r in baris:
+            if ws is None or isi_sheet >= MAKS_BARIS_XLSX:
+                no_sheet += 1
+                nama = judul[:31] if no_sheet == 1 else f"{judul[:26]} ({no_sheet})"
+                ws = wb.create_sheet(title=nama)
+                ws.append(kolom_header)
+                isi_sheet = 0
+            ws.append(list(r))
+            isi_sheet += 1
+    if ws is None:
+        wb.create_sheet(title=judul[:31])
+    wb.save(fileobj)
+
+
+def export_ke_file(engine, jenis, params, fmt="csv"):
+    """Jalankan export laporan lewat file sementara di disk; kembalikan isinya sebagai bytes.
+    st.download_button hanya menerima str/bytes/buffer in-memory, bukan file di disk."""
+    batches = iter_batch(engine, QUERY_EXPORT[jenis], params)
+    with tempfile.TemporaryFile() as f:
+        if fmt == "xlsx":
+            tulis_xlsx(batches, f, JUDUL_EXPORT[jenis])
+        else:
+            tulis_csv(batches, f)
+        f.seek(0)
+        return f.read()
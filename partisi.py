@@ -0,0 +1,311 @@
+"""Partisi bulanan tabel transactions (RANGE pada tgl_sls) & arsip partisi lama.
+
+    python partisi.py migrasi [--bulan-ke-depan 3]        # sekali saja: ubah transactions jadi partitioned
+    python partisi.py jaga [--bulan-ke-depan 3]           # harian (cron): buat partisi bulan-bulan berikutnya
+    python partisi.py arsip --sebelum 2024-01 [--lepas]   # arsip partisi < Jan 2024 ke CSV.gz lalu drop
+    python partisi.py daftar
+
+Koneksi diambil dari --url, env DATABASE_URL, atau secrets.toml (lihat db.buat_engine).
+
+Catatan kunci unik: di tabel partitioned, constraint UNIQUE wajib memuat kolom partisi, jadi kunci
+(nomdok, kode_itm, qty_sls, net_sls) menjadi (nomdok, kode_itm, qty_sls, net_sls, tgl_sls). Satu baris
+dokumen selalu punya satu tanggal, jadi artinya tetap sama. Primary key (id) juga menjadi (id, tgl_sls);
+apa saja yang dibawa/tidak dibawa migrasi tercatat di migrasi_ke_partisi. Upload memakai ON CONFLICT DO NOTHING
+tanpa target sehingga jalan di skema lama maupun baru. Periode yang sudah diarsip dicatat di
+partisi_arsip dan upload menolak baris di periode tersebut, supaya duplikat tidak masuk lagi.
+"""
+import argparse
+import datetime
+import gzip
+import os
+import re
+
+from sqlalchemy import text
+
+from db import buat_engine
+
+TABEL = "transactions"
+KUNCI_UNIK = "nomdok, kode_itm, qty_sls, net_sls, tgl_sls"
+BULAN_KE_DEPAN = 3
+FOLDER_ARSIP = "arsip"
+
+_POLA_NAMA = re.compile(rf"^{TABEL}_p(\d{{4}})_(\d{{2}})$")
+
+Q_BUAT_PARTISI_ARSIP = """
+    CREATE TABLE IF NOT EXISTS partisi_arsip (
+        nama_partisi TEXT PRIMARY KEY,
+        dari DATE NOT NULL,
+        sampai DATE NOT NULL,
+        lokasi TEXT,
+        jumlah_baris BIGINT NOT NULL DEFAULT 0,
+        created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+    )
+"""
+
+
+def awal_bulan(tgl):
+    return datetime.date(tgl.year, tgl.month, 1)
+
+
+def bulan_berikut(tgl):
+    return datetime.date(tgl.year + tgl.month // 12, tgl.month % 12 + 1, 1)
+
+
+def nama_partisi(bulan):
+    return f"{TABEL}_p{bulan.year:04d}_{bulan.month:02d}"
+
+
+def _sudah_partitioned(c):
+    return c.execute(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:t))"
+    ), {"t": TABEL}).scalar()
+
+
+def _salin_akses(c, sumber, tujuan, dengan_policy=True):
+    """Samakan RLS, policy & GRANT tabel tujuan dengan sumber.
+    Tabel baru di Supabase dapat default privileges untuk anon/authenticated, jadi ACL tujuan
+    dikosongkan dulu lalu diisi persis seperti sumber."""
+    rls, paksa = c.execute(text(
+        "SELECT relrowsecurity, relforcerowsecurity FROM pg_class WHERE oid = to_regclass(:t)"
+    ), {"t": sumber}).one()
+    if rls:
+        c.execute(text(f"ALTER TABLE {tujuan} ENABLE ROW LEVEL SECURITY"))
+    if paksa:
+        c.execute(text(f"ALTER TABLE {tujuan} FORCE ROW LEVEL SECURITY"))
+
+    q_acl = """
+        SELECT CASE WHEN a.grantee = 0 THEN 'PUBLIC' ELSE quote_ident(pg_get_userbyid(a.grantee)) END,
+               a.privilege_type, a.is_grantable
+        FROM pg_class k, aclexplode(k.relacl) a
+        WHERE k.oid = to_regclass(:t) AND a.grantee <> k.relowner
+    """
+    for (role,) in set((r[0],) for r in c.execute(text(q_acl), {"t": tujuan}).fetchall()):
+        c.execute(text(f"REVOKE ALL ON {tujuan} FROM {role}"))
+    for role, hak, opsi in c.execute(text(q_acl), {"t": sumber}).fetchall():
+        c.execute(text(f"GRANT {hak} ON {tujuan} TO {role}" + (" WITH GRANT OPTION" if opsi else "")))
+
+    if not dengan_policy:
+        return
+    for nama, permissive, perintah, roles, pakai, cek in c.execute(text("""
+        SELECT quote_ident(polname), polpermissive,
+               CASE polcmd WHEN 'r' THEN 'SELECT' WHEN 'a' THEN 'INSERT' WHEN 'w' THEN 'UPDATE'
+                           WHEN 'd' THEN 'DELETE' ELSE 'ALL' END,
+               ARRAY(SELECT CASE WHEN r = 0 THEN 'PUBLIC' ELSE quote_ident(pg_get_userbyid(r)) END
+                     FROM unnest(polroles) r),
+               pg_get_expr(polqual, polrelid), pg_get_expr(polwithcheck, polrelid)
+        FROM pg_policy WHERE polrelid = to_regclass(:t)
+    """), {"t": sumber}).fetchall():
+        c.execute(text(
+            f"CREATE POLICY {nama} ON {tujuan} AS {'PERMISSIVE' if permissive else 'RESTRICTIVE'} "
+            f"FOR {perintah} TO {', '.join(roles)}"
+            + (f" USING ({pakai})" if pakai else "") + (f" WITH CHECK ({cek})" if cek else "")
+        ))
+
+
+def daftar_partisi(c):
+    """List (nama, bulan) partisi bulanan yang terpasang, urut dari yang terlama"""
+    rows = c.execute(text("""
+        SELECT child.relname FROM pg_inherits i
+        JOIN pg_class child ON child.oid = i.inhrelid
+        WHERE i.inhparent = to_regclass(:t)
+    """), {"t": TABEL}).fetchall()
+    hasil = []
+    for (nama,) in rows:
+        m = _POLA_NAMA.match(nama)
+        if m:
+            hasil.append((nama, datetime.date(int(m.group(1)), int(m.group(2)), 1)))
+    return sorted(hasil, key=lambda x: x[1])
+
+
+def buat_partisi_bulan(c, bulan):
+    """Buat partisi satu bulan. Baris yang terlanjur masuk partisi DEFAULT untuk bulan itu dipindahkan"""
+    nama = nama_partisi(bulan)
+    if c.execute(text("SELECT to_regclass(:n)"), {"n": nama}).scalar():
+        return False
+    rentang = {"a": bulan, "b": bulan_berikut(bulan)}
+    # Postgres menolak CREATE PARTITION kalau DEFAULT masih berisi baris di rentang tsb
+    c.execute(text(f"CREATE TEMP TABLE _pindah (LIKE {TABEL})"))
+    c.execute(text(f"""
+        WITH d AS (DELETE FROM {TABEL}_default WHERE tgl_sls >= :a AND tgl_sls < :b RETURNING *)
+        INSERT INTO _pindah SELECT * FROM d
+    """), rentang)
+    c.execute(text(
+        f"CREATE TABLE {nama} PARTITION OF {TABEL} FOR VALUES FROM ('{rentang['a']}') TO ('{rentang['b']}')"
+    ))
+    # Akses langsung ke partisi (mis. lewat REST Supabase) mengikuti induk; RLS tanpa policy = ditolak
+    _salin_akses(c, TABEL, nama, dengan_policy=False)
+    c.execute(text(f"INSERT INTO {TABEL} OVERRIDING SYSTEM VALUE SELECT * FROM _pindah"))
+    c.execute(text("DROP TABLE _pindah"))
+    return True
+
+
+def jaga_partisi(engine, bulan_ke_depan=BULAN_KE_DEPAN, hari_ini=None):
+    """Pastikan partisi bulan ini s/d N bulan ke depan sudah ada. Aman dijalankan berulang"""
+    bulan = awal_bulan(hari_ini or datetime.date.today())
+    dibuat = []
+    with engine.begin() as c:
+        if not _sudah_partitioned(c):
+            raise RuntimeError(f"Tabel {TABEL} belum partitioned, jalankan 'python partisi.py migrasi' dulu")
+        for _ in range(bulan_ke_depan + 1):
+            if buat_partisi_bulan(c, bulan):
+                dibuat.append(nama_partisi(bulan))
+            bulan = bulan_berikut(bulan)
+    return dibuat
+
+
+def _kolom(c, tabel, kolom_idx):
+    """Nama kolom dari int2vector indkey (0 = ekspresi, dilewati)"""
+    return [c.execute(text("SELECT attname FROM pg_attribute WHERE attrelid = to_regclass(:t) AND attnum = :n"),
+                      {"t": tabel, "n": n}).scalar() for n in kolom_idx if n]
+
+
+def migrasi_ke_partisi(engine, bulan_ke_depan=BULAN_KE_DEPAN):
+    """Ubah transactions menjadi partitioned (bulanan) dalam satu transaksi.
+    Tabel lama disimpan sebagai transactions_lama untuk verifikasi, drop manual setelah yakin.
+
+    Yang dibawa ke tabel baru: kolom beserta default, NOT NULL, CHECK, komentar, kolom identity
+    (sequence baru dilanjutkan dari nilai terbesar), sequence serial, primary key (ditambah tgl_sls),
+    index non-unik, serta RLS, policy dan GRANT (RLS & GRANT juga dipasang di tiap partisi).
+    Kunci unik lama diganti KUNCI_UNIK.
+
+    Yang TIDAK dibawa: trigger, foreign key (dari maupun ke tabel ini), keanggotaan publication
+    (mis. Supabase Realtime) dan pemilik tabel (tabel baru milik user yang menjalankan migrasi).
+    Index/constraint unik lain yang tidak memuat tgl_sls tidak bisa ada di tabel partitioned,
+    jadi migrasi ditolak kalau ada. Baris dengan tgl_sls NULL juga ditolak bila tabel punya primary key.
+    """
+    with engine.begin() as c:
+        if _sudah_partitioned(c):
+            return False
+        kunci_lama = set(KUNCI_UNIK.replace(" ", "").split(",")) - {"tgl_sls"}
+        pk, index_biasa = [], []
+        for oid, indkey, unik, primer, definisi in c.execute(text("""
+            SELECT i.indexrelid, i.indkey::int2[], i.indisunique, i.indisprimary, pg_get_indexdef(i.indexrelid)
+            FROM pg_index i WHERE i.indrelid = to_regclass(:t)
+        """), {"t": TABEL}).fetchall():
+            kolom = _kolom(c, TABEL, indkey)
+            if primer:
+                pk = kolom
+            elif not unik:
+                index_biasa.append(definisi[definisi.index(" USING "):])
+            elif set(kolom) - {"tgl_sls"} != kunci_lama:
+                raise RuntimeError(f"Index unik tanpa tgl_sls tidak bisa dipartisi: {definisi}")
+        if pk and c.execute(text(f"SELECT EXISTS (SELECT 1 FROM {TABEL} WHERE tgl_sls IS NULL)")).scalar():
+            raise RuntimeError("Ada baris dengan tgl_sls NULL; primary key baru (… , tgl_sls) menolaknya")
+
+        c.execute(text(f"ALTER TABLE {TABEL} RENAME TO {TABEL}_lama"))
+        c.execute(text(
+            f"CREATE TABLE {TABEL} (LIKE {TABEL}_lama INCLUDING ALL EXCLUDING INDEXES) PARTITION BY RANGE (tgl_sls)"
+        ))
+        c.execute(text(f"ALTER TABLE {TABEL} ADD CONSTRAINT {TABEL}_kunci_unik UNIQUE ({KUNCI_UNIK})"))
+        if pk:
+            c.execute(text(f"ALTER TABLE {TABEL} ADD PRIMARY KEY ({', '.join(pk + [k for k in ['tgl_sls'] if k not in pk])})"))
+        # Untuk filter Dashboard / Laporan Rekap (salesman + rentang tanggal)
+        c.execute(text(f"CREATE INDEX {TABEL}_rep_tgl_idx ON {TABEL} (rep_sls, tgl_sls)"))
+        for definisi in index_biasa:
+            if definisi != " USING btree (rep_sls, tgl_sls)":
+                c.execute(text(f"CREATE INDEX ON {TABEL}{definisi}"))
+        _salin_akses(c, f"{TABEL}_lama", TABEL)
+        # tgl_sls di luar partisi yang ada tetap bisa masuk
+        c.execute(text(f"CREATE TABLE {TABEL}_default PARTITION OF {TABEL} DEFAULT"))
+        _salin_akses(c, TABEL, f"{TABEL}_default", dengan_policy=False)
+
+        # Sequence kolom serial (mis. id) dipindah kepemilikannya agar tidak ikut ter-drop bersama tabel lama
+        for (kolom,) in c.execute(text("""
+            SELECT a.attname FROM pg_attribute a JOIN pg_attrdef d ON d.adrelid = a.attrelid AND d.adnum = a.attnum
+            WHERE a.attrelid = to_regclass(:t) AND pg_get_expr(d.adbin, d.adrelid) LIKE 'nextval(%'
+        """), {"t": f"{TABEL}_lama"}).fetchall():
+            seq = c.execute(text("SELECT pg_get_serial_sequence(:t, :k)"), {"t": f"{TABEL}_lama", "k": kolom}).scalar()
+            if seq:
+                c.execute(text(f"ALTER SEQUENCE {seq} OWNED BY {TABEL}.{kolom}"))
+
+        tgl_min = c.execute(text(f"SELECT min(tgl_sls) FROM {TABEL}_lama")).scalar()
+        bulan = awal_bulan(tgl_min or datetime.date.today())
+        batas = awal_bulan(datetime.date.today())
+        for _ in range(bulan_ke_depan):
+            batas = bulan_berikut(batas)
+        while bulan <= batas:
+            buat_partisi_bulan(c, bulan)
+            bulan = bulan_berikut(bulan)
+
+        c.execute(text(f"INSERT INTO {TABEL} OVERRIDING SYSTEM VALUE SELECT * FROM {TABEL}_lama ON CONFLICT DO NOTHING"))
+
+        # Kolom identity dapat sequence baru dari LIKE; lanjutkan dari posisi sequence lama
+        for (kolom,) in c.execute(text(
+            "SELECT attname FROM pg_attribute WHERE attrelid = to_regclass(:t) AND attidentity <> ''"
+        ), {"t": TABEL}).fetchall():
+            seq_lama = c.execute(text("SELECT pg_get_serial_sequence(:t, :k)"), {"t": f"{TABEL}_lama", "k": kolom}).scalar()
+            c.execute(text(f"""
+                SELECT setval(pg_get_serial_sequence(:t, :k),
+                              GREATEST((SELECT max({kolom}) FROM {TABEL}), (SELECT last_value FROM {seq_lama}), 1))
+            """), {"t": TABEL, "k": kolom})
+    with engine.connect() as c:
+        c.execution_options(isolation_level="AUTOCOMMIT").execute(text(f"ANALYZE {TABEL}"))
+    return True
+
+
+def arsip_partisi(engine, sebelum, folder=FOLDER_ARSIP, lepas_saja=False):
+    """Lepas (DETACH) partisi yang seluruhnya sebelum bulan `sebelum`.
+    Default: isi partisi ditulis ke <folder>/<nama>.csv.gz lalu tabelnya di-drop.
+    lepas_saja=True: tabel hanya dilepas dan tetap ada sebagai tabel biasa."""
+    sebelum = awal_bulan(sebelum)
+    hasil = []
+    with engine.connect() as c:
+        target = [(n, b) for n, b in daftar_partisi(c) if bulan_berikut(b) <= sebelum]
+    for nama, bulan in target:
+        with engine.begin() as c:
+            c.execute(text(Q_BUAT_PARTISI_ARSIP))
+            c.execute(text(f"ALTER TABLE {TABEL} DETACH PARTITION {nama}"))
+            jumlah = c.execute(text(f"SELECT count(*) FROM {nama}")).scalar()
+            lokasi = nama
+            if not lepas_saja:
+                os.makedirs(folder, exist_ok=True)
+                lokasi = os.path.join(folder, f"{nama}.csv.gz")
+                cur = c.connection.dbapi_connection.cursor()
+                with gzip.open(lokasi, "wb") as f:
+                    cur.copy_expert(f"COPY {nama} TO STDOUT WITH CSV HEADER", f)
+                c.execute(text(f"DROP TABLE {nama}"))
+            c.execute(text("""
+                INSERT INTO partisi_arsip (nama_partisi, dari, sampai, lokasi, jumlah_baris)
+                VALUES (:n, :a, :b, :l, :j)
+            """), {"n": nama, "a": bulan, "b": bulan_berikut(bulan), "l": lokasi, "j": jumlah})
+        hasil.append((nama, jumlah, lokasi))
+    return hasil
+
+
+def batas_arsip(c):
+    """Tanggal pertama yang masih aktif (baris sebelum ini sudah diarsip), atau None"""
+    if not c.execute(text("SELECT to_regclass('partisi_arsip')")).scalar():
+        return None
+    return c.execute(text("SELECT max(sampai) FROM partisi_arsip")).scalar()
+
+
+def _bulan(s):
+    return datetime.datetime.strptime(s, "%Y-%m").date()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintenance partisi bulanan tabel transactions")
+    parser.add_argument("--url", help="URL database (default: DATABASE_URL / secrets.toml)")
+    sub = parser.add_subparsers(dest="perintah", required=True)
+    for nama in ("migrasi", "jaga"):
+        p = sub.add_parser(nama)
+        p.add_argument("--bulan-ke-depan", type=int, default=BULAN_KE_DEPAN)
+    p = sub.add_parser("arsip")
+    p.add_argument("--sebelum", type=_bulan, required=True, help="YYYY-MM, partisi sebelum bulan ini diarsip")
+    p.add_argument("--folder", default=FOLDER_ARSIP)
+    p.add_argument("--lepas", action="store_true", help="Hanya DETACH, tanpa export & drop")
+    sub.add_parser("daftar")
+    args = parser.parse_args()
+
+    engine = buat_engine(args.url)
+    if args.perintah == "migrasi":
+        print("Migrasi selesai." if migrasi_ke_partisi(engine, args.bulan_ke_depan) else f"{TABEL} sudah partitioned.")
+    elif args.perintah == "jaga":
+        print("Partisi baru:", ", ".join(jaga_partisi(engine, args.bulan_ke_depan)) or "-")
+    elif args.perintah == "arsip":
+        for nama, jumlah, lokasi in arsip_partisi(engine, args.sebelum, args.folder, args.lepas):
+            print(f"{nama}: {jumlah} baris -> {lokasi}")
+    else:
+        with engine.connect() as c:
+            for nama, bulan in daftar_partisi(c):
+                print(nama, bulan)
@@ -0,0 +1,55 @@
+import threading
+import time
+
+from db import RuteBaca
+
+
+class _ReplicaPalsu:
+    """Engine palsu: query cek lag menunggu `lepas` sebelum menjawab lag 0"""
+
+    def __init__(self):
+        self.lepas = threading.Event()
+        self.query = []
+
+    def connect(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params=None):
+        self.query.append(str(query))
+        if "pg_is_in_recovery" in str(query):
+            self.lepas.wait(5)
+        return self
+
+    def scalar(self):
+        return 0
+
+
+def test_cek_lag_tidak_menahan_sesi_lain():
+    replica = _ReplicaPalsu()
+    rute = RuteBaca(replica, jeda_cek_detik=60)
+    cek = threading.Thread(target=rute.lag_replica)
+    cek.start()
+    while not rute._sedang_cek:
+        time.sleep(0.01)
+
+    # Selama cek berjalan, sesi lain langsung ke primary tanpa menunggu replica
+    t0 = time.monotonic()
+    assert rute.pakai_replica() is False
+    assert time.monotonic() - t0 < 0.5
+
+    replica.lepas.set()
+    cek.join()
+    assert rute.pakai_replica() is True
+
+
+def test_cek_memakai_statement_timeout():
+    replica = _ReplicaPalsu()
+    replica.lepas.set()
+    RuteBaca(replica).lag_replica()
+    assert "statement_timeout" in replica.query[0]
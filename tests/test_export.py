@@ -0,0 +1,43 @@
+import csv
+import io
+
+import pytest
+from openpyxl import load_workbook
+from streamlit.testing.v1 import AppTest
+
+import export
+
+KOLOM = ["nomdok", "tgl_sls", "qty_sls"]
+BARIS = [("D1", "2025-01-05", 1.0), ("D2", "2025-01-06", 2.5)]
+
+
+@pytest.fixture(autouse=True)
+def batch_palsu(monkeypatch):
+    # Tanpa DB: iter_batch diganti dua batch kecil
+    monkeypatch.setattr(export, "iter_batch", lambda engine, q, params: iter([(KOLOM, BARIS[:1]), (KOLOM, BARIS[1:])]))
+
+
+def _halaman_export(fmt):
+    import streamlit as st
+
+    import export
+
+    data = export.export_ke_file(None, "transaksi", {}, fmt)
+    st.download_button("Unduh", data, file_name=f"transaksi.{fmt}", mime=export.MIME[fmt])
+
+
+@pytest.mark.parametrize("fmt", ["csv", "xlsx"])
+def test_export_diterima_download_button(fmt):
+    at = AppTest.from_function(_halaman_export, args=(fmt,)).run()
+    assert not at.exception
+
+
+def test_isi_csv():
+    data = export.export_ke_file(None, "transaksi", {}, "csv")
+    assert list(csv.reader(io.StringIO(data.decode("utf-8")))) == [KOLOM, ["D1", "2025-01-05", "1.0"], ["D2", "2025-01-06", "2.5"]]
+
+
+def test_isi_xlsx():
+    ws = load_workbook(io.BytesIO(export.export_ke_file(None, "transaksi", {}, "xlsx"))).active
+    assert ws.title == export.JUDUL_EXPORT["transaksi"]
+    assert [tuple(r) for r in ws.iter_rows(values_only=True)] == [tuple(KOLOM), *BARIS]
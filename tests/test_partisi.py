@@ -0,0 +1,130 @@
+"""Uji migrasi/jaga/arsip partisi terhadap Postgres sungguhan.
+
+Dilewati kalau TEST_DATABASE_URL tidak diisi. Semua tabel dibuat di schema uji_partisi
+(lewat search_path) yang dihapus lagi setelah tes, jadi jangan arahkan ke database produksi.
+"""
+import datetime
+import gzip
+import os
+
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+URL = os.environ.get("TEST_DATABASE_URL")
+pytestmark = pytest.mark.skipif(not URL, reason="TEST_DATABASE_URL tidak diisi")
+
+SCHEMA = "uji_partisi"
+
+# Bentuk tabel lama seperti dibuat Supabase: id identity + kunci unik 4 kolom, RLS & grant
+Q_TABEL_LAMA = """
+    CREATE TABLE transactions (
+        id int8 GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+        created_at timestamptz NOT NULL DEFAULT now(),
+        nomdok text, tgl_sls date, rep_sls text, nama_spv text, cust_id text, nama_cst text,
+        kode_itm text, nama_itm text, qty_sls float8, net_sls float8,
+        UNIQUE (nomdok, kode_itm, qty_sls, net_sls)
+    );
+    CREATE INDEX transactions_cust_idx ON transactions (cust_id);
+    CREATE TABLE master_customer (cust_id text PRIMARY KEY, salesman_pengampu text);
+    ALTER TABLE transactions ENABLE ROW LEVEL SECURITY;
+    CREATE POLICY baca_semua ON transactions FOR SELECT TO PUBLIC USING (true);
+    GRANT SELECT ON transactions TO PUBLIC;
+"""
+# Seperti Supabase: tabel baru otomatis dapat hak tambahan lewat default privileges
+Q_DEFAULT_PRIVILEGES = f"ALTER DEFAULT PRIVILEGES IN SCHEMA {SCHEMA} GRANT INSERT, DELETE ON TABLES TO PUBLIC"
+
+
+@pytest.fixture
+def engine():
+    admin = create_engine(URL)
+    with admin.begin() as c:
+        c.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        c.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+    eng = create_engine(URL, connect_args={"options": f"-c search_path={SCHEMA}"})
+    with eng.begin() as c:
+        c.execute(text(Q_TABEL_LAMA))
+        c.execute(text("""
+            INSERT INTO transactions (nomdok, tgl_sls, rep_sls, cust_id, kode_itm, qty_sls, net_sls) VALUES
+            ('D1', '2025-01-10', 'Budi', 'C1', 'A1', 1, 1000),
+            ('D2', '2025-02-10', 'Budi', 'C1', 'A1', 2, 2000)
+        """))
+        c.execute(text(Q_DEFAULT_PRIVILEGES))
+    yield eng
+    eng.dispose()
+    with admin.begin() as c:
+        c.execute(text(f"DROP SCHEMA {SCHEMA} CASCADE"))
+    admin.dispose()
+
+
+def _baris(nomdok, tgl):
+    return {'nomdok': nomdok, 'tgl_sls': tgl, 'rep_sls': 'Budi', 'nama_spv': '', 'cust_id': 'C1',
+            'nama_cst': '', 'kode_itm': 'A1', 'nama_itm': '', 'qty_sls': 3.0, 'net_sls': 3000.0}
+
+
+def test_migrasi_upload_jaga_arsip(engine, tmp_path):
+    from partisi import arsip_partisi, batas_arsip, jaga_partisi, migrasi_ke_partisi
+    from upload import simpan_transaksi
+
+    assert migrasi_ke_partisi(engine, bulan_ke_depan=1)
+    with engine.connect() as c:
+        assert c.execute(text("SELECT count(*) FROM transactions")).scalar() == 2
+        pk = c.execute(text("""
+            SELECT pg_get_constraintdef(oid) FROM pg_constraint
+            WHERE conrelid = to_regclass('transactions') AND contype = 'p'
+        """)).scalar()
+        assert pk == "PRIMARY KEY (id, tgl_sls)"
+        indexdef = c.execute(text("SELECT string_agg(indexdef, ';') FROM pg_indexes WHERE tablename = 'transactions'")).scalar()
+        assert "(cust_id)" in indexdef
+        assert c.execute(text("SELECT relrowsecurity FROM pg_class WHERE oid = to_regclass('transactions_p2025_01')")).scalar()
+        assert c.execute(text("SELECT policyname FROM pg_policies WHERE tablename = 'transactions'")).scalar() == "baca_semua"
+        assert c.execute(text("SELECT attidentity FROM pg_attribute WHERE attrelid = to_regclass('transactions') AND attname = 'id'")).scalar() == "d"
+        # Hak PUBLIC persis seperti tabel lama (hanya SELECT), termasuk di partisi
+        for tabel in ("transactions", "transactions_p2025_01", "transactions_default"):
+            acl = c.execute(text("SELECT relacl::text[] FROM pg_class WHERE oid = to_regclass(:t)"), {"t": tabel}).scalar()
+            assert [a.split("/")[0] for a in acl if a.startswith("=")] == ["=r"], tabel
+
+    # Upload setelah migrasi: id diisi identity, lanjut dari id lama; kembaran dilewati
+    df = pd.DataFrame([_baris('D3', datetime.date(2025, 2, 11))])
+    with Session(engine) as s:
+        assert simpan_transaksi(s, df) == 1
+        assert simpan_transaksi(s, df) == 0
+        s.commit()
+    with engine.connect() as c:
+        assert c.execute(text("SELECT id FROM transactions WHERE nomdok = 'D3'")).scalar() == 3
+
+    # Baris di bulan tanpa partisi masuk DEFAULT, lalu dipindah saat jaga membuat partisinya
+    hari_ini = datetime.date.today()
+    jauh = datetime.date(hari_ini.year + 2, 6, 15)
+    with Session(engine) as s:
+        simpan_transaksi(s, pd.DataFrame([_baris('D4', jauh)]))
+        s.commit()
+    with engine.connect() as c:
+        assert c.execute(text("SELECT count(*) FROM transactions_default")).scalar() == 1
+    dibuat = jaga_partisi(engine, bulan_ke_depan=1, hari_ini=jauh.replace(day=1))
+    assert f"transactions_p{jauh.year}_06" in dibuat
+    with engine.connect() as c:
+        assert c.execute(text("SELECT count(*) FROM transactions_default")).scalar() == 0
+        assert c.execute(text(f"SELECT nomdok FROM transactions_p{jauh.year}_06")).scalar() == "D4"
+
+    # Arsip Januari 2025: file CSV.gz berisi baris D1, partisi hilang, upload periode itu ditolak
+    hasil = arsip_partisi(engine, datetime.date(2025, 2, 1), folder=str(tmp_path))
+    assert [(n, j) for n, j, _ in hasil] == [("transactions_p2025_01", 1)]
+    with gzip.open(hasil[0][2], "rt") as f:
+        assert "D1" in f.read()
+    with engine.connect() as c:
+        assert c.execute(text("SELECT to_regclass('transactions_p2025_01')")).scalar() is None
+        assert c.execute(text("SELECT count(*) FROM transactions")).scalar() == 3
+        assert batas_arsip(c) == datetime.date(2025, 2, 1)
+
+
+def test_migrasi_ditolak_kalau_ada_unik_tanpa_tgl(engine):
+    from partisi import migrasi_ke_partisi
+
+    with engine.begin() as c:
+        c.execute(text("CREATE UNIQUE INDEX transactions_nomdok_uq ON transactions (nomdok)"))
+    with pytest.raises(RuntimeError, match="Index unik"):
+        migrasi_ke_partisi(engine)
+    with engine.connect() as c:
+        assert c.execute(text("SELECT to_regclass('transactions_lama')")).scalar() is None
@@ -0,0 +1,76 @@
+import io
+
+import pandas as pd
+
+from upload import baca_file_upload, sidik_blok, validasi_transaksi
+
+CSV_TRANSAKSI = b"""nomdok,tgl_sls,rep_sls,cust_id,kode_itm,qty_sls,net_sls
+D1,2025-01-05,Budi,010023,A1,1,1000
+D2,2025-01-05,Budi,,A1,2,2000
+D3,2025-01-06,Budi,20045,A2,3,3000
+"""
+
+
+def _file(data, nama):
+    f = io.BytesIO(data)
+    f.name = nama
+    return f
+
+
+def test_baca_csv_cust_id_tetap_teks():
+    df = baca_file_upload(_file(CSV_TRANSAKSI, "jual.csv"))
+    bersih, tolak, _ = validasi_transaksi(df, {"Budi"}, {"010023", "20045"})
+    # Nol di depan tidak hilang dan tidak ada '20045.0' walau ada cust_id kosong
+    assert bersih['cust_id'].tolist() == ["010023", "20045"]
+    assert tolak['alasan'].tolist() == ["cust_id kosong"]
+
+
+def test_baca_excel_cust_id_tetap_teks():
+    buf = io.BytesIO()
+    pd.read_csv(io.BytesIO(CSV_TRANSAKSI), dtype={'cust_id': str}).to_excel(buf, index=False)
+    df = baca_file_upload(_file(buf.getvalue(), "jual.xlsx"))
+    bersih, _, _ = validasi_transaksi(df, {"Budi"}, {"010023", "20045"})
+    assert bersih['cust_id'].tolist() == ["010023", "20045"]
+
+
+def test_cust_id_float_dinormalkan():
+    # Frame yang dibaca tanpa dtype=str: cust_id jadi float karena ada sel kosong
+    df = pd.read_csv(io.BytesIO(CSV_TRANSAKSI))
+    assert df['cust_id'].dtype == float
+    bersih, _, _ = validasi_transaksi(df, {"Budi"}, {"10023", "20045"})
+    assert bersih['cust_id'].tolist() == ["10023", "20045"]
+
+
+def test_sidik_blok_tidak_tergantung_dtype():
+    # File kedua berisi hari yang sama + satu hari lain dengan qty kosong (kolom jadi float64)
+    f1 = baca_file_upload(_file(CSV_TRANSAKSI, "a.csv"))
+    f2 = baca_file_upload(_file(CSV_TRANSAKSI + b"D4,2025-01-07,Budi,20045,A3,,4000\n", "b.csv"))
+    b1, _, _ = validasi_transaksi(f1, {"Budi"}, {"010023", "20045"})
+    b2, _, _ = validasi_transaksi(f2, {"Budi"}, {"010023", "20045"})
+    sidik1 = set(sidik_blok(b1))
+    sidik2 = set(sidik_blok(b2))
+    assert sidik1 < sidik2
+    assert len(sidik2 - sidik1) == 1
+
+
+def test_duplikat_beda_tanggal_tidak_dibuang():
+    # Kunci unik transactions (partitioned) memuat tgl_sls, jadi baris ini dua baris berbeda
+    data = CSV_TRANSAKSI + b"D1,2025-02-05,Budi,010023,A1,1,1000\nD1,2025-01-05,Budi,010023,A1,1,1000\n"
+    bersih, _, duplikat = validasi_transaksi(baca_file_upload(_file(data, "c.csv")), {"Budi"}, {"010023", "20045"})
+    assert duplikat == 1
+    d1 = bersih[bersih['nomdok'] == "D1"]
+    assert sorted(str(t) for t in d1['tgl_sls']) == ["2025-01-05", "2025-02-05"]
+
+
+def test_tanggal_hari_dulu_konsisten():
+    data = b"""nomdok,tgl_sls,rep_sls,cust_id,kode_itm,qty_sls,net_sls
+D1,05/01/2025,Budi,20045,A1,1,1000
+D2,13/01/2025,Budi,20045,A1,1,1000
+D3,01/13/2025,Budi,20045,A1,1,1000
+D4,2025-01-07 00:00:00,Budi,20045,A1,1,1000
+"""
+    bersih, tolak, _ = validasi_transaksi(baca_file_upload(_file(data, "t.csv")), {"Budi"}, {"20045"})
+    assert [str(t) for t in bersih['tgl_sls']] == ["2025-01-05", "2025-01-13", "2025-01-07"]
+    # Bulan dulu tidak ditebak, tapi ditolak
+    assert tolak['nomdok'].tolist() == ["D3"]
+    assert tolak['alasan'].tolist() == ["tgl_sls tidak valid"]
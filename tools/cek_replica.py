@@ -0,0 +1,46 @@
+"""Uji rute baca (db.RuteBaca) terhadap primary + replica Postgres lokal.
+
+    python tools/cek_replica.py postgresql://.../erp postgresql://...:5433/erp [--maks-lag 5] [--putaran 5]
+
+Setiap putaran menulis satu baris di primary, lalu mencatat kapan RuteBaca mengizinkan baca ke
+replica untuk sesi yang baru menulis (read-your-writes) dan berapa lag yang terbaca. Untuk melihat
+fallback: hentikan replica (pg_ctl stop) atau jeda replay (SELECT pg_wal_replay_pause()) di tengah
+jalan. Keputusan harus pindah ke primary lalu kembali ke replica setelah pulih.
+"""
+import argparse
+import os
+import sys
+import time
+
+from sqlalchemy import create_engine, text
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from db import CONNECT_ARGS_REPLICA, RuteBaca, lsn_primary  # noqa: E402
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("primary")
+    parser.add_argument("replica")
+    parser.add_argument("--maks-lag", type=float, default=5.0)
+    parser.add_argument("--putaran", type=int, default=5)
+    parser.add_argument("--batas-tunggu", type=float, default=10.0, help="Detik menunggu replica menyusul")
+    args = parser.parse_args()
+
+    primary = create_engine(args.primary)
+    rute = RuteBaca(create_engine(args.replica, connect_args=CONNECT_ARGS_REPLICA), maks_lag_detik=args.maks_lag, jeda_cek_detik=0)
+
+    with primary.begin() as c:
+        c.execute(text("CREATE TABLE IF NOT EXISTS _cek_replica (id serial PRIMARY KEY, waktu timestamptz DEFAULT now())"))
+
+    for i in range(args.putaran):
+        with primary.connect() as c:
+            c.execute(text("INSERT INTO _cek_replica DEFAULT VALUES"))
+            c.commit()
+            lsn = lsn_primary(c)
+        t0 = time.perf_counter()
+        while not rute.pakai_replica(lsn) and time.perf_counter() - t0 < args.batas_tunggu:
+            time.sleep(0.01)
+        dt = time.perf_counter() - t0
+        tujuan = "replica" if rute.pakai_replica(lsn) else "PRIMARY (fallback)"
+        print(f"putaran {i + 1}: lsn {lsn}, lag {rute.lag_replica()}, baca -> {tujuan} setelah {dt * 1000:.0f} ms")
+        time.sleep(1)
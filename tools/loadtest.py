@@ -0,0 +1,390 @@
+"""Load test: banyak sesi Streamlit bersamaan terhadap app.py + database lokal yang sudah di-seed.
+
+    python tools/loadtest.py --db-url postgresql://postgres@localhost/erp_load --seed --sesi 40 --durasi 60
+
+Alurnya:
+  1. (--seed) isi database lokal dengan user lt_* (salesman/spv/admin), pelanggan, target & transaksi.
+     Jangan arahkan ke database produksi.
+  2. Jalankan `streamlit run app.py` di port terpisah dengan secrets sementara yang menunjuk --db-url.
+  3. Buka N sesi websocket (protokol yang sama dengan browser). Tiap sesi login sesuai perannya,
+     pindah halaman & ganti filter secara acak dengan jeda berpikir.
+  4. Laporan: throughput, persentil latensi per aksi, error, dan jumlah koneksi DB (pg_stat_activity).
+
+Butuh paket `websockets` (sudah ikut terpasang bersama Streamlit versi baru).
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from collections import defaultdict
+
+import websockets
+from sqlalchemy import create_engine, text
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+PASSWORD = "loadtest"
+
+NAMA_BULAN = [
+    "Januari", "Februari", "Maret", "April", "Mei", "Juni",
+    "Juli", "Agustus", "September", "Oktober", "November", "Desember"
+]
+
+# Jenis nilai widget di WidgetState, per tipe elemen
+TIPE_NILAI = {
+    "text_input": "string_value",
+    "selectbox": "string_value",
+    "radio": "string_value",
+    "date_input": "string_array_value",
+    "checkbox": "bool_value",
+}
+
+
+# --- SEED DATABASE LOKAL ---
+Q_SKEMA = """
+    CREATE TABLE IF NOT EXISTS users (
+        id SERIAL PRIMARY KEY, username TEXT UNIQUE, password TEXT, role TEXT, real_name TEXT, nama_spv TEXT
+    );
+    CREATE TABLE IF NOT EXISTS master_spv (id SERIAL PRIMARY KEY, nama_spv TEXT);
+    CREATE TABLE IF NOT EXISTS master_customer (
+        cust_id TEXT PRIMARY KEY, nama_cst TEXT, alamat TEXT, salesman_pengampu TEXT
+    );
+    CREATE TABLE IF NOT EXISTS target_sales (
+        id SERIAL PRIMARY KEY, salesman_nama TEXT, bulan INT, tahun INT, target_qty NUMERIC, target_tagihan NUMERIC,
+        UNIQUE (salesman_nama, bulan, tahun)
+    );
+    CREATE TABLE IF NOT EXISTS transactions (
+        id SERIAL PRIMARY KEY, nomdok TEXT, tgl_sls DATE, rep_sls TEXT, nama_spv TEXT, cust_id TEXT, nama_cst TEXT,
+        kode_itm TEXT, nama_itm TEXT, qty_sls NUMERIC, net_sls NUMERIC,
+        UNIQUE (nomdok, kode_itm, qty_sls, net_sls)
+    );
+"""
+
+
+def seed(engine, n_sales, n_spv, n_transaksi):
+    """Data sintetis dengan prefix lt_ / LT supaya mudah dibersihkan; aman dijalankan ulang"""
+    with engine.begin() as c:
+        for q in Q_SKEMA.split(";"):
+            if q.strip():
+                c.execute(text(q))
+        p = {"ns": n_sales, "nspv": n_spv, "pw": PASSWORD, "nt": n_transaksi}
+        c.execute(text("""
+            INSERT INTO master_spv (nama_spv)
+            SELECT 'LT SPV ' || j FROM generate_series(0, :nspv - 1) j
+            WHERE NOT EXISTS (SELECT 1 FROM master_spv WHERE nama_spv = 'LT SPV ' || j)
+        """), p)
+        c.execute(text("""
+            INSERT INTO users (username, password, role, real_name, nama_spv)
+            SELECT 'lt_sales_' || i, :pw, 'salesman', 'LT Sales ' || i, 'LT SPV ' || (i % :nspv)
+            FROM generate_series(0, :ns - 1) i
+            UNION ALL SELECT 'lt_spv_' || j, :pw, 'spv', 'LT SPV ' || j, '' FROM generate_series(0, :nspv - 1) j
+            UNION ALL SELECT 'lt_admin', :pw, 'admin', 'LT Admin', ''
+            ON CONFLICT (username) DO NOTHING
+        """), p)
+        c.execute(text("""
+            INSERT INTO master_customer (cust_id, nama_cst, alamat, salesman_pengampu)
+            SELECT 'LT' || lpad(k::text, 6, '0'), 'Toko LT ' || k, 'Jl. Uji ' || k, 'LT Sales ' || (k % :ns)
+            FROM generate_series(0, :ns * 50 - 1) k
+            ON CONFLICT (cust_id) DO NOTHING
+        """), p)
+        c.execute(text("""
+            INSERT INTO target_sales (salesman_nama, bulan, tahun, target_qty, target_tagihan)
+            SELECT 'LT Sales ' || i, m, y, 1000 + i * 10, 50000000
+            FROM generate_series(0, :ns - 1) i, generate_series(1, 12) m, generate_series(2024, 2027) y
+            ON CONFLICT (salesman_nama, bulan, tahun) DO NOTHING
+        """), p)
+        # Transaksi tersebar 2 tahun terakhir s/d hari ini
+        c.execute(text("""
+            INSERT INTO transactions (nomdok, tgl_sls, rep_sls, nama_spv, cust_id, nama_cst, kode_itm, nama_itm, qty_sls, net_sls)
+            SELECT 'LT' || lpad(t::text, 9, '0'), CURRENT_DATE - (t % 730), 'LT Sales ' || (t % :ns),
+                   'LT SPV ' || ((t % :ns) % :nspv), 'LT' || lpad((t % (:ns * 50))::text, 6, '0'), 'Toko LT',
+                   'I' || lpad((t % 300)::text, 4, '0'), 'Produk ' || (t % 300), 1 + t % 20, 10000 * (1 + t % 500)
+            FROM generate_series(0, :nt - 1) t
+            ON CONFLICT DO NOTHING
+        """), p)
+    with engine.connect() as c:
+        c.execution_options(isolation_level="AUTOCOMMIT").execute(text("ANALYZE"))
+
+
+# --- SERVER STREAMLIT ---
+def jalankan_server(db_url, port):
+    """Start app.py dengan secrets sementara; kembalikan (proses, folder kerja).
+    Output server ditulis ke <folder>/streamlit.log (pipe yang tidak dibaca bisa penuh dan membuat server macet)."""
+    folder = tempfile.mkdtemp(prefix="erp_load_")
+    os.makedirs(os.path.join(folder, ".streamlit"))
+    with open(os.path.join(folder, ".streamlit", "secrets.toml"), "w") as f:
+        f.write(f"[connections.supabase]\nurl = {json.dumps(db_url)}\n")
+    path_log = os.path.join(folder, "streamlit.log")
+    with open(path_log, "wb") as log:
+        proses = subprocess.Popen(
+            [sys.executable, "-m", "streamlit", "run", APP,
+             "--server.headless", "true", "--server.port", str(port),
+             "--server.enableXsrfProtection", "false", "--server.fileWatcherType", "none",
+             "--browser.gatherUsageStats", "false"],
+            cwd=folder, stdout=log, stderr=subprocess.STDOUT,
+        )
+    batas = time.time() + 60
+    while time.time() < batas:
+        if proses.poll() is not None:
+            with open(path_log, encoding="utf-8", errors="replace") as f:
+                raise RuntimeError("Server Streamlit berhenti:\n" + f.read())
+        try:
+            with urllib.request.urlopen(f"http://localhost:{port}/_stcore/health", timeout=1) as r:
+                if r.read().strip() == b"ok":
+                    return proses, folder
+        except OSError:
+            time.sleep(0.3)
+    proses.kill()
+    raise RuntimeError(f"Server Streamlit tidak siap dalam 60 detik (log: {path_log})")
+
+
+# --- KLIEN SESI (PROTOKOL WEBSOCKET STREAMLIT) ---
+class Hasil:
+    def __init__(self):
+        self.latensi = defaultdict(list)
+        self.error = defaultdict(int)
+        self.contoh_error = []
+
+    def catat(self, aksi, detik, pesan_error):
+        self.latensi[aksi].append(detik)
+        if pesan_error:
+            self.error[aksi] += 1
+            if len(self.contoh_error) < 10:
+                self.contoh_error.append(f"{aksi}: {pesan_error[:200]}")
+
+
+class KlienStreamlit:
+    """Satu tab browser: menyimpan state widget dan mengirim rerun seperti frontend"""
+
+    def __init__(self, ws, hasil, batas_detik=60):
+        self.ws = ws
+        self.hasil = hasil
+        self.batas_detik = batas_detik
+        self.nilai = {}   # id widget -> WidgetState (dikirim ulang setiap rerun)
+        self.elemen = {}  # label -> (tipe, id) dari run terakhir
+        self.id_menu = None
+
+    async def rerun(self, aksi, ubah=None, tekan=None, menu=None):
+        """ubah: {label: nilai}, tekan: label tombol, menu: nama halaman option_menu"""
+        for label, nilai in (ubah or {}).items():
+            tipe, wid = self.elemen[label]
+            ws_state = WidgetState(id=wid)
+            jenis = TIPE_NILAI[tipe]
+            if jenis == "string_array_value":
+                ws_state.string_array_value.data[:] = [nilai]
+            else:
+                setattr(ws_state, jenis, nilai)
+            self.nilai[wid] = ws_state
+        if menu is not None and self.id_menu:
+            self.nilai[self.id_menu] = WidgetState(id=self.id_menu, json_value=json.dumps(menu))
+
+        msg = BackMsg()
+        msg.rerun_script.query_string = ""
+        msg.rerun_script.widget_states.widgets.extend(self.nilai.values())
+        if tekan is not None:
+            msg.rerun_script.widget_states.widgets.append(WidgetState(id=self.elemen[tekan][1], trigger_value=True))
+
+        t0 = time.perf_counter()
+        await self.ws.send(msg.SerializePartialToString())
+        try:
+            pesan_error = await asyncio.wait_for(self._tunggu_selesai(), self.batas_detik)
+        except asyncio.TimeoutError:
+            # Stream sudah tidak sinkron dengan run ini, sesi dihentikan
+            self.hasil.catat(aksi, time.perf_counter() - t0, f"timeout > {self.batas_detik} dtk")
+            raise
+        self.hasil.catat(aksi, time.perf_counter() - t0, pesan_error)
+
+    async def _tunggu_selesai(self):
+        elemen, pesan_error = {}, None
+        while True:
+            fm = ForwardMsg()
+            fm.ParseFromString(await self.ws.recv())
+            jenis = fm.WhichOneof("type")
+            if jenis == "delta" and fm.delta.WhichOneof("type") == "new_element":
+                el = fm.delta.new_element
+                tipe = el.WhichOneof("type")
+                isi = getattr(el, tipe)
+                if tipe == "exception":
+                    pesan_error = pesan_error or f"{isi.type}: {isi.message}"
+                elif tipe == "alert" and isi.format == isi.ERROR:
+                    pesan_error = pesan_error or isi.body
+                elif tipe == "component_instance" and "option_menu" in isi.component_name:
+                    self.id_menu = isi.id
+                elif getattr(isi, "label", None) and getattr(isi, "id", None):
+                    elemen[isi.label] = (tipe, isi.id)
+            elif jenis == "script_finished":
+                if fm.script_finished == ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                    continue  # st.rerun(): server langsung menjalankan ulang, tunggu run berikutnya
+                if fm.script_finished == ForwardMsg.FINISHED_WITH_COMPILE_ERROR:
+                    pesan_error = pesan_error or "compile error"
+                self.elemen = elemen
+                return pesan_error
+
+
+# --- SKENARIO PER PERAN ---
+async def aksi_dashboard(k):
+    await k.rerun("dashboard", menu="Dashboard")
+    if "📅 Pilih Bulan" in k.elemen:
+        await k.rerun("dashboard: ganti bulan", ubah={"📅 Pilih Bulan": random.choice(NAMA_BULAN)})
+
+
+async def aksi_tren(k):
+    await k.rerun("tren", menu="Tren Penjualan")
+
+
+async def aksi_rekap(k):
+    await k.rerun("rekap", menu="Laporan Rekap")
+    if "Dari Tanggal" in k.elemen:
+        awal = datetime.date.today() - datetime.timedelta(days=random.choice([7, 30, 90, 365]))
+        await k.rerun("rekap: ganti periode", ubah={"Dari Tanggal": awal.strftime("%Y/%m/%d")})
+
+
+async def aksi_pelanggan(k):
+    await k.rerun("kelola pelanggan", menu="Kelola Pelanggan")
+    if "🔍 Cari Nama / Alamat / ID:" in k.elemen:
+        await k.rerun("kelola pelanggan: cari", ubah={"🔍 Cari Nama / Alamat / ID:": f"Toko LT {random.randint(0, 99)}"})
+
+
+async def aksi_target(k):
+    await k.rerun("input target", menu="Input Target")
+
+
+SKENARIO = {
+    "salesman": [aksi_dashboard, aksi_dashboard, aksi_tren, aksi_rekap],
+    "spv": [aksi_dashboard, aksi_tren, aksi_rekap, aksi_pelanggan, aksi_target],
+    "admin": [aksi_dashboard, aksi_rekap, aksi_pelanggan, aksi_target],
+}
+
+
+async def sesi(port, peran, username, selesai_pada, jeda, hasil):
+    try:
+        async with websockets.connect(
+            f"ws://localhost:{port}/_stcore/stream", subprotocols=["streamlit"], max_size=None
+        ) as ws:
+            k = KlienStreamlit(ws, hasil)
+            await k.rerun("buka halaman")
+            await k.rerun("login", ubah={"Username": username, "Password": PASSWORD}, tekan="MASUK SISTEM")
+            while time.time() < selesai_pada:
+                await random.choice(SKENARIO[peran])(k)
+                await asyncio.sleep(random.uniform(*jeda))
+    except asyncio.TimeoutError:
+        pass
+    except Exception as e:
+        hasil.catat("koneksi", 0.0, f"{type(e).__name__}: {e}")
+
+
+async def pantau_koneksi_db(engine, selesai_pada, sampel):
+    """Sampel pg_stat_activity tiap detik: (total, active) koneksi ke database ini"""
+    def ambil():
+        with engine.connect() as c:
+            return tuple(c.execute(text("""
+                SELECT count(*), count(*) FILTER (WHERE state = 'active')
+                FROM pg_stat_activity WHERE datname = current_database() AND pid <> pg_backend_pid()
+            """)).one())
+    while time.time() < selesai_pada:
+        sampel.append(await asyncio.to_thread(ambil))
+        await asyncio.sleep(1)
+
+
+def persentil(data, p):
+    data = sorted(data)
+    return data[min(len(data) - 1, int(round(p / 100 * (len(data) - 1))))]
+
+
+def laporan(hasil, sampel, durasi, n_sesi):
+    semua = [x for v in hasil.latensi.values() for x in v]
+    total_error = sum(hasil.error.values())
+    print(f"\n=== {n_sesi} sesi, {durasi:.0f} dtk: {len(semua)} rerun, {len(semua) / durasi:.1f} rerun/dtk, {total_error} error ===")
+    print(f"{'aksi':28s} {'n':>6s} {'err':>5s} {'p50':>8s} {'p90':>8s} {'p99':>8s} {'maks':>8s}")
+    for aksi, lat in sorted(hasil.latensi.items()):
+        print(f"{aksi:28s} {len(lat):6d} {hasil.error[aksi]:5d} "
+              + " ".join(f"{persentil(lat, p) * 1000:7.0f}ms" for p in (50, 90, 99))
+              + f" {max(lat) * 1000:7.0f}ms")
+    if semua:
+        print(f"{'SEMUA':28s} {len(semua):6d} {total_error:5d} "
+              + " ".join(f"{persentil(semua, p) * 1000:7.0f}ms" for p in (50, 90, 99))
+              + f" {max(semua) * 1000:7.0f}ms")
+    if sampel:
+        total = [s[0] for s in sampel]
+        aktif = [s[1] for s in sampel]
+        print(f"\nKoneksi DB: rata-rata {statistics.mean(total):.1f}, maks {max(total)}; "
+              f"active rata-rata {statistics.mean(aktif):.1f}, maks {max(aktif)}")
+    if hasil.contoh_error:
+        print("\nContoh error:")
+        for e in hasil.contoh_error:
+            print("  -", e)
+
+
+def bagi_peran(n_sesi, campuran, n_sales, n_spv):
+    """Daftar (peran, username) sesuai proporsi campuran, mis. {'salesman': 70, 'spv': 20, 'admin': 10}"""
+    total = sum(campuran.values())
+    daftar = []
+    for i in range(n_sesi):
+        peran = random.choices(list(campuran), weights=[v / total for v in campuran.values()])[0]
+        if peran == "salesman":
+            daftar.append((peran, f"lt_sales_{i % n_sales}"))
+        elif peran == "spv":
+            daftar.append((peran, f"lt_spv_{i % n_spv}"))
+        else:
+            daftar.append((peran, "lt_admin"))
+    return daftar
+
+
+async def utama(args):
+    engine = create_engine(args.db_url, pool_size=1)
+    campuran = {k: int(v) for k, v in (x.split("=") for x in args.campuran.split(","))}
+    peran = bagi_peran(args.sesi, campuran, args.salesman, args.spv)
+    hasil, sampel = Hasil(), []
+    mulai = time.time()
+    selesai_pada = mulai + args.durasi
+    tugas = []
+    for i, (p, u) in enumerate(peran):
+        tugas.append(asyncio.create_task(sesi(args.port, p, u, selesai_pada, (args.jeda_min, args.jeda_maks), hasil)))
+        # Ramp-up supaya login tidak jatuh di milidetik yang sama
+        await asyncio.sleep(args.ramp / max(args.sesi, 1))
+    pantau = asyncio.create_task(pantau_koneksi_db(engine, selesai_pada, sampel))
+    await asyncio.gather(*tugas, pantau)
+    laporan(hasil, sampel, time.time() - mulai, args.sesi)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test sesi bersamaan untuk app.py")
+    parser.add_argument("--db-url", required=True, help="Database LOKAL untuk di-seed & dipakai app")
+    parser.add_argument("--seed", action="store_true", help="Isi data uji (user lt_*, pelanggan, target, transaksi)")
+    parser.add_argument("--salesman", type=int, default=40)
+    parser.add_argument("--spv", type=int, default=4)
+    parser.add_argument("--transaksi", type=int, default=500_000)
+    parser.add_argument("--sesi", type=int, default=30, help="Jumlah sesi bersamaan")
+    parser.add_argument("--durasi", type=float, default=60, help="Detik")
+    parser.add_argument("--ramp", type=float, default=5, help="Detik untuk membuka semua sesi")
+    parser.add_argument("--campuran", default="salesman=70,spv=20,admin=10")
+    parser.add_argument("--jeda-min", type=float, default=0.5, help="Jeda berpikir minimum antar aksi (dtk)")
+    parser.add_argument("--jeda-maks", type=float, default=2.0)
+    parser.add_argument("--port", type=int, default=8599)
+    parser.add_argument("--tanpa-server", action="store_true", help="Pakai server yang sudah jalan di --port")
+    args = parser.parse_args()
+
+    if args.seed:
+        print("Seeding database...")
+        seed(create_engine(args.db_url), args.salesman, args.spv, args.transaksi)
+
+    proses = None
+    if not args.tanpa_server:
+        proses, folder = jalankan_server(args.db_url, args.port)
+        print(f"Log server: {os.path.join(folder, 'streamlit.log')}")
+    try:
+        asyncio.run(utama(args))
+    finally:
+        if proses is not None:
+            proses.terminate()
+            proses.wait(timeout=10)
@@ -0,0 +1,266 @@
+"""Validasi & ingest massal upload transaksi (dipakai halaman Upload di app.py).
+
+    python upload.py siapkan    # sekali saja: buat tabel ingest_log (riwayat fingerprint upload)
+
+Koneksi diambil dari --url, env DATABASE_URL, atau secrets.toml (lihat db.buat_engine).
+Selama ingest_log belum dibuat, upload tetap jalan tapi tanpa ingest inkremental.
+"""
+import argparse
+import hashlib
+
+import pandas as pd
+from sqlalchemy import text
+
+from db import buat_engine
+
+# --- KONFIGURASI KOLOM UPLOAD TRANSAKSI ---
+KOLOM_WAJIB = ['cust_id', 'tgl_sls', 'rep_sls', 'qty_sls', 'net_sls']
+KOLOM_TEKS = ['nomdok', 'rep_sls', 'nama_spv', 'cust_id', 'nama_cst', 'kode_itm', 'nama_itm']
+KOLOM_ANGKA = ['qty_sls', 'net_sls']
+# Sama dengan constraint unik tabel transactions yang sudah dipartisi (lihat partisi.KUNCI_UNIK).
+# Di skema lama (tanpa tgl_sls) sisa duplikatnya tetap dibuang oleh ON CONFLICT DO NOTHING.
+KUNCI_UNIK = ['nomdok', 'kode_itm', 'qty_sls', 'net_sls', 'tgl_sls']
+# Format tgl_sls yang diterima: ISO (tahun dulu, termasuk sel tanggal Excel yang dibaca sebagai teks)
+# atau hari dulu seperti export lokal. Bulan dulu (mm/dd) tidak pernah dipakai; yang tidak cocok ditolak.
+FORMAT_TANGGAL = ['%Y-%m-%d', '%Y-%m-%d %H:%M:%S', '%d/%m/%Y', '%d-%m-%Y', '%d/%m/%Y %H:%M:%S']
+
+UKURAN_BLOK = 5000
+
+
+def baca_file_upload(file):
+    """Baca file upload (CSV/Excel) dengan semua kolom sebagai teks, nama kolom di-lowercase.
+
+    Tanpa dtype=str, kode seperti cust_id yang punya sel kosong terbaca float (10023 -> '10023.0')
+    dan nol di depan hilang. Angka & tanggal tetap di-parse oleh validasi_transaksi.
+    """
+    if file.name.endswith('.csv'):
+        df = pd.read_csv(file, dtype=str)
+    else:
+        df = pd.read_excel(file, dtype=str)
+    df.columns = [str(c).strip().lower() for c in df.columns]
+    return df
+
+
+def _kolom_teks(df, col):
+    """Kolom teks bersih: NaN jadi '' (bukan string 'nan'), spasi di ujung dibuang"""
+    if col not in df.columns:
+        return pd.Series('', index=df.index, dtype=object)
+    s = df[col]
+    if pd.api.types.is_float_dtype(s):
+        # Kode yang terlanjur terbaca float: 10023.0 -> '10023', bukan '10023.0'
+        bulat = s.notna() & (s % 1 == 0)
+        s = s.astype(object).mask(bulat, s[bulat].astype('int64').astype(str))
+    return s.where(s.notna(), '').astype(str).str.strip()
+
+
+def _parse_tanggal(s):
+    """Parse tanggal satu kolom dengan FORMAT_TANGGAL saja (tanpa tebakan per baris); gagal -> NaT"""
+    if pd.api.types.is_datetime64_any_dtype(s):
+        return s
+    teks = s.astype(str).str.strip()
+    hasil = pd.Series(pd.NaT, index=s.index, dtype='datetime64[ns]')
+    for fmt in FORMAT_TANGGAL:
+        sisa = hasil.isna() & s.notna()
+        if not sisa.any():
+            break
+        hasil[sisa] = pd.to_datetime(teks[sisa], format=fmt, errors='coerce')
+    return hasil
+
+
+def validasi_transaksi(df, rep_valid=None, cust_valid=None, batas_tgl=None):
+    """Validasi semua baris upload transaksi dalam satu lintasan vektor.
+
+    rep_valid / cust_valid adalah set nama salesman & ID pelanggan yang dikenal (None = tidak dicek).
+    batas_tgl: tanggal sebelum ini sudah diarsip, baris di periode itu ditolak.
+    Mengembalikan (df_bersih, df_tolak, jumlah_duplikat). df_tolak berisi data asli + kolom 'baris' & 'alasan';
+    jumlah_duplikat = baris valid yang dibuang karena kembar (KUNCI_UNIK) dengan baris lain di file yang sama.
+    """
+    bersih = pd.DataFrame(index=df.index)
+    for c in KOLOM_TEKS:
+        bersih[c] = _kolom_teks(df, c)
+
+    bersih['tgl_sls'] = _parse_tanggal(df['tgl_sls'])
+    for c in KOLOM_ANGKA:
+        bersih[c] = pd.to_numeric(df[c], errors='coerce')
+
+    alasan = pd.Series('', index=df.index, dtype=object)
+
+    def tandai(mask, pesan):
+        nonlocal alasan
+        alasan = alasan.mask(mask, alasan + pesan + '; ')
+
+    tandai(bersih['cust_id'] == '', "cust_id kosong")
+    tandai(bersih['rep_sls'] == '', "rep_sls kosong")
+    tandai(df['tgl_sls'].isna(), "tgl_sls kosong")
+    tandai(df['tgl_sls'].notna() & bersih['tgl_sls'].isna(), "tgl_sls tidak valid")
+    for c in KOLOM_ANGKA:
+        # Sel kosong tetap dianggap 0 (perilaku lama), tapi teks bukan angka ditolak
+        tandai(df[c].notna() & bersih[c].isna(), f"{c} bukan angka")
+    if batas_tgl is not None:
+        tandai(bersih['tgl_sls'] < pd.Timestamp(batas_tgl), "periode tgl_sls sudah diarsip")
+    if rep_valid is not None:
+        tandai((bersih['rep_sls'] != '') & ~bersih['rep_sls'].isin(rep_valid), "rep_sls tidak terdaftar")
+    if cust_valid is not None:
+        tandai((bersih['cust_id'] != '') & ~bersih['cust_id'].isin(cust_valid), "cust_id tidak terdaftar")
+
+    ditolak = alasan != ''
+
+    df_tolak = df[ditolak].copy()
+    # Nomor baris sesuai file Excel/CSV (baris 1 = header)
+    df_tolak.insert(0, 'baris', df_tolak.index + 2)
+    df_tolak['alasan'] = alasan[ditolak].str.rstrip('; ')
+
+    bersih = bersih[~ditolak]
+    # Tipe dibakukan (angka selalu float, teks sudah string bersih) supaya sidik_blok tidak
+    # berubah hanya karena pandas menebak int64 di satu file dan float64 di file lain
+    bersih[KOLOM_ANGKA] = bersih[KOLOM_ANGKA].fillna(0.0).astype(float)
+    bersih['tgl_sls'] = bersih['tgl_sls'].dt.date
+    # Duplikat di dalam file tetap akan dibuang oleh ON CONFLICT, jadi buang di sini saja
+    jumlah_valid = len(bersih)
+    bersih = bersih.drop_duplicates(subset=KUNCI_UNIK)
+    return bersih, df_tolak, jumlah_valid - len(bersih)
+
+
+# --- INGEST MASSAL (SATU ROUND-TRIP PER BLOK) ---
+Q_INSERT_TRANSAKSI = """
+    INSERT INTO transactions (nomdok, tgl_sls, rep_sls, nama_spv, cust_id, nama_cst, kode_itm, nama_itm, qty_sls, net_sls)
+    SELECT * FROM UNNEST(
+        CAST(:nom AS text[]), CAST(:tgl AS date[]), CAST(:rep AS text[]), CAST(:spv AS text[]),
+        CAST(:cid AS text[]), CAST(:cnm AS text[]), CAST(:kitm AS text[]), CAST(:nitm AS text[]),
+        CAST(:qty AS float8[]), CAST(:net AS float8[])
+    )
+    ON CONFLICT DO NOTHING
+"""
+
+# Auto Update Mapping jika kosong
+Q_UPDATE_MAPPING = """
+    UPDATE master_customer m
+    SET salesman_pengampu = u.rep
+    FROM UNNEST(CAST(:cid AS text[]), CAST(:rep AS text[])) AS u(cid, rep)
+    WHERE m.cust_id = u.cid AND (m.salesman_pengampu IS NULL OR m.salesman_pengampu = '')
+"""
+
+
+def simpan_transaksi(session, df_bersih, ukuran_blok=UKURAN_BLOK, progress=None):
+    """Insert transaksi hasil validasi per blok (tanpa commit, commit di pemanggil).
+    Mengembalikan jumlah baris yang benar-benar masuk (yang bentrok kunci unik dilewati ON CONFLICT)."""
+    total = len(df_bersih)
+    masuk = 0
+    for awal in range(0, total, ukuran_blok):
+        blok = df_bersih.iloc[awal:awal + ukuran_blok]
+        masuk += session.execute(text(Q_INSERT_TRANSAKSI), {
+            "nom": blok['nomdok'].tolist(),
+            "tgl": blok['tgl_sls'].tolist(),
+            "rep": blok['rep_sls'].tolist(),
+            "spv": blok['nama_spv'].tolist(),
+            "cid": blok['cust_id'].tolist(),
+            "cnm": blok['nama_cst'].tolist(),
+            "kitm": blok['kode_itm'].tolist(),
+            "nitm": blok['nama_itm'].tolist(),
+            "qty": blok['qty_sls'].astype(float).tolist(),
+            "net": blok['net_sls'].astype(float).tolist(),
+        }).rowcount
+        if progress: progress(min(awal + ukuran_blok, total) / total)
+
+    # Baris pertama per pelanggan yang menang, sama seperti loop lama
+    df_map = df_bersih.drop_duplicates(subset='cust_id', keep='first')
+    if not df_map.empty:
+        session.execute(text(Q_UPDATE_MAPPING), {
+            "cid": df_map['cust_id'].tolist(),
+            "rep": df_map['rep_sls'].tolist(),
+        })
+    return masuk
+
+
+# --- SIDIK JARI (FINGERPRINT) UNTUK INGEST INKREMENTAL ---
+# Blok = semua baris bersih pada satu tgl_sls, sehingga export bulanan yang saling
+# tumpang tindih tetap menghasilkan blok yang sama untuk hari-hari yang tidak berubah.
+KOLOM_SIDIK = ['nomdok', 'tgl_sls', 'rep_sls', 'nama_spv', 'cust_id', 'nama_cst', 'kode_itm', 'nama_itm', 'qty_sls', 'net_sls']
+
+Q_BUAT_INGEST_LOG = """
+    CREATE TABLE IF NOT EXISTS ingest_log (
+        fingerprint TEXT PRIMARY KEY,
+        jenis TEXT NOT NULL,
+        jumlah_baris INTEGER NOT NULL DEFAULT 0,
+        nama_file TEXT,
+        diunggah_oleh TEXT,
+        created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+    )
+"""
+
+
+def sidik_file(data):
+    """Fingerprint isi file mentah (bytes)"""
+    return "file:" + hashlib.sha256(data).hexdigest()
+
+
+def sidik_blok(df_bersih):
+    """Fingerprint per blok harian. Mengembalikan Series (index sama dengan df_bersih) berisi fingerprint blok tiap baris"""
+    if df_bersih.empty:
+        return pd.Series(dtype=object)
+    hash_baris = pd.util.hash_pandas_object(df_bersih[KOLOM_SIDIK].astype(str), index=False)
+    tgl = df_bersih['tgl_sls'].astype(str)
+    sidik = {}
+    for hari, h in hash_baris.groupby(tgl):
+        # Diurutkan supaya urutan baris di file tidak mengubah fingerprint
+        sidik[hari] = f"blok:{hari}:" + hashlib.sha256(h.sort_values().values.tobytes()).hexdigest()
+    return tgl.map(sidik)
+
+
+def siapkan_ingest_log(engine):
+    """Buat tabel ingest_log (langkah setup, bukan di jalur request upload)"""
+    with engine.begin() as c:
+        c.execute(text(Q_BUAT_INGEST_LOG))
+
+
+def ingest_log_ada(session):
+    return session.execute(text("SELECT to_regclass('ingest_log')")).scalar() is not None
+
+
+def fingerprint_tercatat(session, daftar_fp):
+    """Subset fingerprint yang sudah ada di ingest_log (kosong kalau tabelnya belum dibuat)"""
+    if not daftar_fp or not ingest_log_ada(session):
+        return set()
+    rows = session.execute(
+        text("SELECT fingerprint FROM ingest_log WHERE fingerprint = ANY(:fp)"), {"fp": list(daftar_fp)}
+    ).fetchall()
+    return {r[0] for r in rows}
+
+
+def saring_blok_baru(session, df_bersih):
+    """Buang blok yang sudah pernah diingest sebelum ada kerja insert ke DB.
+    Mengembalikan (df_baru, dict fingerprint -> jumlah baris untuk blok baru)"""
+    fp = sidik_blok(df_bersih)
+    tercatat = fingerprint_tercatat(session, set(fp))
+    baru = ~fp.isin(tercatat)
+    return df_bersih[baru], fp[baru].value_counts().to_dict()
+
+
+def catat_ingest(session, fp_jumlah, jenis, nama_file=None, user=None):
+    """Simpan fingerprint ke ingest_log (panggil di transaksi yang sama dengan insert datanya).
+    Mengembalikan False kalau ingest_log belum dibuat (lihat `python upload.py siapkan`)"""
+    if not ingest_log_ada(session):
+        return False
+    if not fp_jumlah:
+        return True
+    session.execute(text("""
+        INSERT INTO ingest_log (fingerprint, jenis, jumlah_baris, nama_file, diunggah_oleh)
+        SELECT fp, :jenis, n, :nama, :user FROM UNNEST(CAST(:fp AS text[]), CAST(:n AS int[])) AS u(fp, n)
+        ON CONFLICT (fingerprint) DO NOTHING
+    """), {
+        "fp": list(fp_jumlah.keys()),
+        "n": [int(v) for v in fp_jumlah.values()],
+        "jenis": jenis, "nama": nama_file, "user": user,
+    })
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Setup tabel pendukung upload transaksi")
+    parser.add_argument("--url", help="URL database (default: DATABASE_URL / secrets.toml)")
+    sub = parser.add_subparsers(dest="perintah", required=True)
+    sub.add_parser("siapkan")
+    args = parser.parse_args()
+
+    siapkan_ingest_log(buat_engine(args.url))
+    print("Tabel ingest_log siap.")